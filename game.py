@@ -1,12 +1,228 @@
 import numpy as np
 from uuid import uuid4 as random_id_generator
 from functools import wraps
+from collections import namedtuple, deque
+import hashlib
+
+## STATE PLANES ##
+# the game state is kept in a stack of uint8 planes with the following format: planes[plane][row, column]
+TERRAIN = 0  # 0 = void, 1 = land, 2 = block
+BOMB_TIMER = 1  # 0 = no bomb, 1-3 = bomb stage
+BLAST = 2  # bitmask of the blast stages on the tile (see BLAST_STAGES)
+OCCUPANCY = 3  # bitmask of the player slots on the tile (bit 0 = player 1, bit 1 = player 2)
+N_PLANES = 4
+
+# blast stages 2-5 (the ids used in the render tool) are stored as bits 0-3 of the blast plane
+BLAST_STAGES = (2, 3, 4, 5)
+BLAST_START = 1 << 0
+BLAST_EXPLODE = 1 << 3
+BLAST_MASK = BLAST_START | 1 << 1 | 1 << 2 | BLAST_EXPLODE
+
+## MAPS ##
+# maps are ASCII grids: '.' = void, '_' = land, '#' = block, '1', '2', ... = starting position of a player (on land).
+# a map scheme can bring its own layout under the "layout" key; otherwise the layout is looked up by map name.
+MAP_LAYOUTS = {
+    'standard': '''
+        1_.#...#.__
+        _#.......#_
+        .##..#..##.
+        ....###....
+        .##..#..##.
+        _#.......#_
+        __.#...#._2
+        ''',
+    'IBM': '''
+        1_..................__
+        _...................._
+        ......................
+        ..##..##.#...#.#.#.#..
+        ......................
+        ..##...#..#..#..#..#..
+        ......................
+        ..##...#.#...#..#..#..
+        ......................
+        ..##...#..#..#.....#..
+        ......................
+        ..##..##.#...#.....#..
+        ......................
+        _...................._
+        __.................._2
+        ''',
+}
+_MAP_LEGEND = {'.': 0, '_': 1, '#': 2}
+
+# a compiled map: a read-only board and the starting position of every player
+MapTemplate = namedtuple('MapTemplate', ['key', 'board', 'player_slots'])
+_map_templates = dict()
+
+
+def compile_map(layout):
+    '''Compile an ASCII map layout into a MapTemplate. Templates are cached per layout.'''
+    if layout not in _map_templates:
+        rows = [row.strip() for row in layout.strip().splitlines()]
+        assert len(set(len(row) for row in rows)) == 1, 'All rows of a map must have the same length.'
+        board = np.zeros((len(rows), len(rows[0])), dtype=np.uint8)
+        player_slots = dict()
+        for r, row in enumerate(rows):
+            for c, tile in enumerate(row):
+                if tile.isdigit():
+                    # players start on land
+                    player_slots[int(tile)] = (r, c)
+                    board[r, c] = 1
+                else:
+                    assert tile in _MAP_LEGEND, 'Unknown map tile {}'.format(repr(tile))
+                    board[r, c] = _MAP_LEGEND[tile]
+        assert sorted(player_slots) == list(range(1, len(player_slots) + 1)), 'Players must be numbered 1, 2, ...'
+        # the occupancy plane holds one bit per player
+        assert len(player_slots) <= 8, 'A map can have at most 8 players.'
+        board.flags.writeable = False
+
+        key = hashlib.sha1('\n'.join(rows).encode()).hexdigest()[:16]
+        _map_templates[layout] = MapTemplate(key, board, tuple(player_slots[p] for p in sorted(player_slots)))
+    return _map_templates[layout]
+
+
+def compile_map_scheme(map_scheme):
+    '''Compile the layout of a map scheme: its own "layout" if it has one, otherwise the layout of its name.'''
+    return compile_map(map_scheme["layout"] if "layout" in map_scheme else MAP_LAYOUTS[map_scheme["name"]])
+
+
+## ACTIONS ##
+# integer action codes, in the order of the move names saved in the player history
+ACTIONS = ('still', 'up', 'down', 'left', 'right', 'bomb')
+STILL, UP, DOWN, LEFT, RIGHT, BOMB = range(len(ACTIONS))
+# (row, column) offset of every action
+ACTION_OFFSETS = np.array([(0, 0), (-1, 0), (1, 0), (0, -1), (0, 1), (0, 0)])
+_ACTION_STEPS = [tuple(offset) for offset in ACTION_OFFSETS.tolist()]
+
+## OUTCOMES ##
+# a finished game is won by player 1, 2, ... or ends in a draw
+ONGOING = 0
+DRAW = -1
+
+## OBSERVATIONS ##
+# channels of the one-hot observation tensor (see Game.observe)
+OBSERVATION_CHANNELS = ('void', 'land', 'block',
+                        'bomb_1', 'bomb_2', 'bomb_3',
+                        'blast_radius_1', 'blast_radius_2', 'blast_radius_3', 'blast_radius_4',
+                        'self', 'opponent')
+_TERRAIN_VALUES = np.array([0, 1, 2], dtype=np.uint8)[:, None, None]
+_BOMB_STAGES = np.array([1, 2, 3], dtype=np.uint8)[:, None, None]
+_BLAST_BITS = np.array([1 << bit for bit in range(len(BLAST_STAGES))], dtype=np.uint8)[:, None, None]
+
+## SNAPSHOTS ##
+# compact, immutable game state: the state and blast owner planes as bytes (the owner planes are None unless
+# the events are enabled) and the player positions and alive flags as tuples
+GameState = namedtuple('GameState', ['frame', 'ended', 'planes', 'positions', 'alive', 'blast_owners'])
+
+## EVENTS ##
+# counters of what happened in the last frame (see Game.enable_events), one entry per player (in the order the
+# players joined):
+#   bombs_placed: bombs dropped by the player
+#   terrain_added: tiles turned into land (by any blast)
+#   terrain_added_by: tiles turned into land by the blasts of the player (overlapping blasts count for both)
+#   killed_by: the numbers of the players whose blasts killed the player (empty if the player was not killed)
+FrameEvents = namedtuple('FrameEvents', ['bombs_placed', 'terrain_added', 'terrain_added_by', 'killed_by'])
+
+
+def _no_events(n_players):
+    return FrameEvents((0,) * n_players, 0, (0,) * n_players, ((),) * n_players)
+
+
+## ZOBRIST HASHING ##
+_zobrist_tables_cache = dict()
+
+
+def _zobrist_tables(shape, n_players):
+    '''Fixed random 64-bit keys for every (plane value, plane cell) and for every alive player.
+    The keys of value 0 are zero, so empty cells do not contribute to the hash.'''
+    key = (shape, n_players)
+    if key not in _zobrist_tables_cache:
+        random_state = np.random.RandomState(seed=20181230)
+        # the terrain, bomb and blast values fit in 4 bits; the occupancy holds one bit per player
+        n_values = max(16, 1 << n_players)
+        cell_keys = random_state.randint(0, 2 ** 64, size=(n_values, N_PLANES * shape[0] * shape[1]),
+                                         dtype=np.uint64)
+        cell_keys[0] = 0
+        alive_keys = random_state.randint(0, 2 ** 64, size=n_players, dtype=np.uint64)
+        _zobrist_tables_cache[key] = cell_keys, alive_keys
+    return _zobrist_tables_cache[key]
+
+
+## BLAST TABLES ##
+_blast_tables_cache = dict()
+
+
+def _blast_table(board, blast_range):
+    '''For every tile (in flat order), the flat indices of the tiles reached by a bomb on that tile.
+    A blast advances up, down, left and right until it hits a block, so the table is cached per block layout.'''
+    blocks = board == 2
+    key = (board.shape, blocks.tobytes(), blast_range)
+    if key not in _blast_tables_cache:
+        n_rows, n_columns = board.shape
+        table = []
+        for pos_r in range(n_rows):
+            for pos_c in range(n_columns):
+                cells = set()
+                for step_r, step_c in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+                    for b in range(blast_range + 1):
+                        r, c = pos_r + b * step_r, pos_c + b * step_c
+                        # stop at the edge of the map or at a block
+                        if not (0 <= r < n_rows and 0 <= c < n_columns) or blocks[r, c]:
+                            break
+                        cells.add(r * n_columns + c)
+                table.append(np.array(sorted(cells), dtype=np.intp))
+        _blast_tables_cache[key] = table
+    return _blast_tables_cache[key]
+
+
+def _blast_masks(board, blast_range):
+    '''The blast table as a (tiles, rows, columns) array of new blast planes.'''
+    masks = np.zeros((board.size,) + board.shape, dtype=np.uint8)
+    for cell, blast_cells in enumerate(_blast_table(board, blast_range)):
+        masks[cell].flat[blast_cells] = BLAST_START
+    return masks
+
+
+def _observe(planes, slot, out):
+    '''Fill the one-hot observation of a player slot from the state planes of one game or a stack of games.'''
+    terrain = planes[..., TERRAIN:TERRAIN + 1, :, :]
+    bomb_timer = planes[..., BOMB_TIMER:BOMB_TIMER + 1, :, :]
+    blast = planes[..., BLAST:BLAST + 1, :, :]
+    occupancy = planes[..., OCCUPANCY, :, :]
+
+    np.equal(terrain, _TERRAIN_VALUES, out=out[..., 0:3, :, :])
+    np.equal(bomb_timer, _BOMB_STAGES, out=out[..., 3:6, :, :])
+    np.not_equal(blast & _BLAST_BITS, 0, out=out[..., 6:10, :, :])
+    np.not_equal(occupancy & (1 << slot), 0, out=out[..., 10, :, :])
+    np.not_equal(occupancy & (0xFF ^ (1 << slot)), 0, out=out[..., 11, :, :])
+    return out
+
+
+def _advance_planes(board, bomb_timer, blast):
+    '''Advance the bombs and blasts one frame. Works on a single game or on a stack of games.
+    Returns the mask of the completed blasts.'''
+    # turn completed blasts into new ground
+    exploded = (blast & BLAST_EXPLODE) != 0
+    board[exploded] = 1
+
+    # update blast (every stage advances one level, completed blasts drop off)
+    np.left_shift(blast, 1, out=blast)
+    blast &= BLAST_MASK
+
+    # advance bombs one level
+    np.add(bomb_timer, 1, out=bomb_timer, where=bomb_timer > 0)
+    # bombs that reached level 4 exploded; remove them
+    bomb_timer[bomb_timer == 4] = 0
+    return exploded
+
 
 class Game:
 
-    def __init__(self, map_scheme, verbose=False):
-        '''Initialize the game.'''
+    def __init__(self, map_scheme, verbose=False, keep_history=True):
+        '''Initialize the game. With keep_history, the moves of the players are saved in their history.'''
         self.verbose = verbose
+        self.keep_history = keep_history
 
         ## initialize the map scheme ##
         self.map_scheme = map_scheme
@@ -18,91 +234,71 @@ class Game:
         self.frame = 0
         self.ended = False
 
-        map_type = self.map_scheme["name"]
-        if map_type == 'standard':
-            ## initialize board with the specified dimensions ##
-            self.board = np.zeros((7, 11))
-            # movable objects is a dictionary of lists with the following format: {}[row][column] = [objects]
-            self.movable_objects = dict()
-            self._bomb_dict = dict()
-            for row in range(self.board.shape[0]):
-                self.movable_objects[row] = dict()
-                self._bomb_dict[row] = dict()
-                for column in range(self.board.shape[1]):
-                    self._bomb_dict[row][column] = 0
-                    self.movable_objects[row][column] = set()
-
-            ## add starting floor to the map ##
-            # upper left
-            self.board[0, 0], self.board[0, 1], self.board[1, 0] = 1, 1, 1
-            # upper right
-            self.board[0, -1], self.board[0, -2], self.board[1, -1] = 1, 1, 1
-            # bottom left
-            self.board[-1, 0], self.board[-2, 0], self.board[-1, 1] = 1, 1, 1
-            # bottom right
-            self.board[-1, -1], self.board[-2, -1], self.board[-1, -2] = 1, 1, 1
-
-            ## add blocks ##
-            self.board[1, 1], self.board[2, 2], self.board[2, 1] = 2, 2, 2
-            self.board[-2, 1], self.board[-3, 1], self.board[-3, 2] = 2, 2, 2
-            self.board[-2, -2], self.board[-3, -3], self.board[-3, -2] = 2, 2, 2
-            self.board[1, -2], self.board[2, -3], self.board[2, -2] = 2, 2, 2
-
-            self.board[0, 3], self.board[0, -4] = 2, 2
-            self.board[-1, 3], self.board[-1, -4] = 2, 2
-
-            self.board[2, 5], self.board[3, 5], self.board[4, 5], self.board[3, 4], self.board[3, -5] = 2, 2, 2, 2, 2
-
-        elif map_type == 'IBM':
-            ## initialize board with the specified dimensions ##
-            self.board = np.zeros((15, 22))
-            # movable objects is a dictionary of lists with the following format: {}[row][column] = [objects]
-            self.movable_objects = dict()
-            self._bomb_dict = dict()
-            for row in range(self.board.shape[0]):
-                self.movable_objects[row] = dict()
-                self._bomb_dict[row] = dict()
-                for column in range(self.board.shape[1]):
-                    self._bomb_dict[row][column] = 0
-                    self.movable_objects[row][column] = set()
-
-            ## add starting floor to the map ##
-            # upper left
-            self.board[0, 0], self.board[0, 1], self.board[1, 0] = 1, 1, 1
-            # upper right
-            self.board[0, -1], self.board[0, -2], self.board[1, -1] = 1, 1, 1
-            # bottom left
-            self.board[-1, 0], self.board[-2, 0], self.board[-1, 1] = 1, 1, 1
-            # bottom right
-            self.board[-1, -1], self.board[-2, -1], self.board[-1, -2] = 1, 1, 1
-
-            ## add blocks ##
-            # I
-            self.board[3, 2], self.board[3, 3], self.board[5, 2], self.board[5, 3] = 2, 2, 2, 2
-            self.board[7, 2], self.board[7, 3], self.board[9, 2], self.board[9, 3] = 2, 2, 2, 2
-            self.board[11, 2], self.board[11, 3] = 2, 2
-
-            # B
-            self.board[3, 6], self.board[3, 7], self.board[3, 9] = 2, 2, 2
-            self.board[5, 7], self.board[5, 10] = 2, 2
-            self.board[7, 7], self.board[7, 9] = 2, 2
-            self.board[9, 7], self.board[9, 10] = 2, 2
-            self.board[11, 6], self.board[11, 7], self.board[11, 9] = 2, 2, 2
-
-            # M
-            self.board[3, 13], self.board[3, 15], self.board[3, 17], self.board[3, 19] = 2, 2, 2, 2
-            self.board[5, 13], self.board[5, 16], self.board[5, 19] = 2, 2, 2
-            self.board[7, 13], self.board[7, 16], self.board[7, 19] = 2, 2, 2
-            self.board[9, 13], self.board[9, 19] = 2, 2
-            self.board[11, 13], self.board[11, 19] = 2, 2
+        ## initialize the board from the compiled map ##
+        self.map_template = compile_map_scheme(self.map_scheme)
+        self._initialize_planes(self.map_template.board.shape)
+        self.board[...] = self.map_template.board
 
         ## define player starting positions (this also defines how many players are available) ##
         self.player_name_to_object = dict()
-        # 2 players
-        self.player_slots = [(0, 0), (self.board.shape[0] - 1, self.board.shape[1] - 1)]
+        self.player_slots = list(self.map_template.player_slots)
         self.players = []
         self.player_action_queue = dict()
 
+        ## zobrist hash of the state (disabled by default, see enable_hashing) ##
+        self._zobrist_keys, self._zobrist_alive = None, None
+        self.zobrist_hash = None
+
+        ## status bookkeeping (kept up to date as the game runs) ##
+        self.terrain_counts = np.bincount(self.board.ravel(), minlength=3)
+        self._state_version = 0
+        self._terrain_version = 0
+        self._terrain_positions = dict()
+        self._status = None
+
+        ## blast tables per blast range (only valid for the current blocks) ##
+        self._blast_tables = dict()
+
+        ## events of the last frame and blast planes per player slot (disabled by default, see enable_events) ##
+        self.blast_owners = None
+        self.events = None
+
+        ## undo journal (disabled by default, see enable_undo) ##
+        self._journal = None
+        self._changes = None
+        self._owner_changes = None
+        self._killed_by = None
+
+        ## cells changed by the last frame update: (state version before, state version after, changed indices) ##
+        self._frame_changes = None
+        self._last_changes = None
+
+    def _initialize_planes(self, shape):
+        '''Allocate the state planes; the board and the object planes are views on the same array.'''
+        self.planes = np.zeros((N_PLANES,) + shape, dtype=np.uint8)
+        self._bind_planes()
+
+    def _bind_planes(self):
+        self.board = self.planes[TERRAIN]
+        self.bomb_timer = self.planes[BOMB_TIMER]
+        self.blast = self.planes[BLAST]
+        self.occupancy = self.planes[OCCUPANCY]
+        self._flat_planes = self.planes.reshape(-1)
+
+    @property
+    def movable_objects(self):
+        '''Dictionary view of the object planes with the following format: {}[row][column] = set(objects).
+        The view is rebuilt on every access, so fetch it once per frame.'''
+        movable_objects = {r: {c: set() for c in range(self.board.shape[1])} for r in range(self.board.shape[0])}
+        for player in self.players:
+            movable_objects[player.position[0]][player.position[1]].add(player.id)
+        for r, c in zip(*np.nonzero(self.bomb_timer)):
+            movable_objects[r][c].add(1)
+        for bit, blast_stage in enumerate(BLAST_STAGES):
+            for r, c in zip(*np.nonzero(self.blast & (1 << bit))):
+                movable_objects[r][c].add(blast_stage)
+        return movable_objects
+
     def _add_player(self, player_instance):
         assert player_instance.name not in [p.name for p in
                                             self.players], 'There is already a player with the name {}'.format(
@@ -120,10 +316,16 @@ class Game:
 
         # assign starting position to the player
         player_instance.position = self.player_slots[len(self.players) - 1]
-        self.movable_objects[player_instance.position[0]][player_instance.position[1]].update([player_instance.id])
+        changes = self._begin_change(OCCUPANCY, player_instance.position[0] * self.board.shape[1] +
+                                     player_instance.position[1])
+        self.occupancy[player_instance.position] |= 1 << (len(self.players) - 1)
+        self._end_change(changes)
+        if self.zobrist_hash is not None:
+            self.zobrist_hash ^= self._zobrist_alive[len(self.players) - 1]
 
         # initialize actions for the player
         self.player_action_queue[player_instance.name] = None
+        self._state_version += 1
 
     def _possible_move(self, next_location_r, next_location_c):
         # if we are at the edge of the map
@@ -136,7 +338,7 @@ class Game:
         if self.board[next_location_r, next_location_c] == 2:
             return False
         # if the next location is a bomb
-        if 1 in self.movable_objects[next_location_r][next_location_c]:
+        if self.bomb_timer[next_location_r, next_location_c]:
             return False
         # if no blocks, return True
         return True
@@ -145,97 +347,118 @@ class Game:
         assert len(self.players) == len(self.player_slots), 'Not all players are loaded in yet.'
         assert self.frame == 0, 'The game is already ongoing.'
         self.frame = 1
+        self._state_version += 1
         if self.verbose:
             print('The game has been started! (id: {})'.format(self.id))
         return True
 
+    def _full_hash(self):
+        '''Compute the zobrist hash of the current state from scratch.'''
+        zobrist_hash = np.bitwise_xor.reduce(self._zobrist_keys[self._flat_planes, np.arange(self.planes.size)])
+        for slot, player in enumerate(self.players):
+            if player.alive:
+                zobrist_hash ^= self._zobrist_alive[slot]
+        return zobrist_hash
+
+    def _begin_change(self, plane, cells):
+        '''Announce a change of the given (unique) flat cells of a plane: their old values are saved in the
+        undo journal and hashed out of the zobrist hash (if enabled). Complete with _end_change.'''
+        idx = plane * self.board.size + np.atleast_1d(cells)
+        old_values = self._flat_planes[idx]
+        if self._changes is not None:
+            self._changes.append((idx, old_values))
+        if self._frame_changes is not None:
+            self._frame_changes.append(idx)
+        if self.zobrist_hash is not None:
+            self.zobrist_hash ^= np.bitwise_xor.reduce(self._zobrist_keys[old_values, idx])
+        return idx
+
+    def _end_change(self, idx):
+        '''Hash the new values of the changed cells into the zobrist hash (if enabled).'''
+        if self.zobrist_hash is not None:
+            self.zobrist_hash ^= np.bitwise_xor.reduce(self._zobrist_keys[self._flat_planes[idx], idx])
+
+    def _begin_owner_change(self, cells):
+        '''Announce a change of the given flat cells of the blast planes per player slot: their old values
+        are saved in the undo journal (if enabled). The owners only change where the blast plane does.'''
+        if self._owner_changes is not None:
+            self._owner_changes.append((cells, self.blast_owners.reshape(len(self.blast_owners), -1)[:, cells]))
+
     def _move_player(self, new_r, new_c, player):
-        # remove player from old position
-        self.movable_objects[player.position[0]][player.position[1]].remove(player.id)
-        # update player position to new position
-        self.movable_objects[new_r][new_c].update([player.id])
+        if (new_r, new_c) != player.position:
+            changes = self._begin_change(OCCUPANCY, np.array([
+                player.position[0] * self.board.shape[1] + player.position[1], new_r * self.board.shape[1] + new_c]))
+            player_bit = 1 << (-player.id - 1)
+            # remove player from old position (the bit is always set there)
+            self.occupancy[player.position] ^= player_bit
+            # update player position to new position
+            self.occupancy[new_r, new_c] |= player_bit
+            self._end_change(changes)
         player.position = (new_r, new_c)
 
-    def _bomb(self, pos_r, pos_c, blast_range=2):
-        self.movable_objects[pos_r][pos_c].update([1])
+    def _bomb(self, pos_r, pos_c, blast_range=2, slot=None):
+        cell = pos_r * self.board.shape[1] + pos_c
 
         # make new bomb tracker
-        self._bomb_dict[pos_r][pos_c] = 1
+        changes = self._begin_change(BOMB_TIMER, cell)
+        self.bomb_timer[pos_r, pos_c] = 1
+        self._end_change(changes)
 
         # add blast range
-        advance_r_plus = True
-        advance_r_min = True
-        advance_c_plus = True
-        advance_c_min = True
-        for b in range(blast_range + 1):
-            # DOWN
-            if pos_r + b in range(self.board.shape[0]):
-                if self.board[pos_r + b, pos_c] != 2 and advance_r_plus:
-                    # if it's not blocked and we didnt encounter one before
-                    self.movable_objects[pos_r + b][pos_c].update([2])
-                else:
-                    # if it's blocked, don't advance anymore
-                    advance_r_plus = False
-            # UP
-            if pos_r - b in range(self.board.shape[0]):
-                if self.board[pos_r - b, pos_c] != 2 and advance_r_min:
-                    # if it's not blocked and we didnt encounter one before
-                    self.movable_objects[pos_r - b][pos_c].update([2])
-                else:
-                    # if it's blocked, don't advance anymore
-                    advance_r_min = False
-            # RIGHT
-            if pos_c + b in range(self.board.shape[1]):
-                if self.board[pos_r, pos_c + b] != 2 and advance_c_plus:
-                    # if it's not blocked and we didnt encounter one before
-                    self.movable_objects[pos_r][pos_c + b].update([2])
-                else:
-                    # if it's blocked, don't advance anymore
-                    advance_c_plus = False
-            # LEFT
-            if pos_c - b in range(self.board.shape[1]):
-                if self.board[pos_r, pos_c - b] != 2 and advance_c_min:
-                    # if it's not blocked and we didnt encounter one before
-                    self.movable_objects[pos_r][pos_c - b].update([2])
-                else:
-                    # if it's blocked, don't advance anymore
-                    advance_c_min = False
+        if blast_range not in self._blast_tables:
+            self._blast_tables[blast_range] = _blast_table(self.board, blast_range)
+        blast_cells = self._blast_tables[blast_range][cell]
+        changes = self._begin_change(BLAST, blast_cells)
+        self.blast.flat[blast_cells] |= BLAST_START
+        self._end_change(changes)
+        if slot is not None and self.blast_owners is not None:
+            self._begin_owner_change(blast_cells)
+            self.blast_owners[slot].flat[blast_cells] |= BLAST_START
+
+    def _blocks_changed(self):
+        '''Drop the blast tables; call this whenever a block is added or removed.'''
+        self._blast_tables = dict()
 
     def _update_blast(self):
-        for r in self.movable_objects.keys():
-            for c, value_set in self.movable_objects.copy()[r].items():
-                # advance / remove bombs
-                if self._bomb_dict[r][c] in [1, 2, 3]:
-                    # advance bomb one level
-                    self._bomb_dict[r][c] += 1
-                if self._bomb_dict[r][c] == 4:
-                    # bomb exploded; remove it
-                    self._bomb_dict[r][c] = 0
-                    self.movable_objects[r][c].remove(1)
-
-                # turn completed blasts into new ground
-                if 5 in self.movable_objects[r][c]:
-                    self.board[r, c] = 1
-                    self.movable_objects[r][c].remove(5)
-
-                # update blast
-                if 4 in value_set:
-                    self.movable_objects[r][c].remove(4)
-                    self.movable_objects[r][c].update([5])
-                if 3 in value_set:
-                    self.movable_objects[r][c].remove(3)
-                    self.movable_objects[r][c].update([4])
-                if 2 in value_set:
-                    self.movable_objects[r][c].remove(2)
-                    self.movable_objects[r][c].update([3])
+        '''Advance the blasts and the bombs. Returns the amount of tiles turned into land in total
+        and per player slot (only counted if the events are enabled).'''
+        # the blasts advance (and may turn into land) and the bombs advance
+        blast_cells = np.flatnonzero(self.blast)
+        changes = [self._begin_change(BLAST, blast_cells),
+                   self._begin_change(TERRAIN, blast_cells),
+                   self._begin_change(BOMB_TIMER, np.flatnonzero(self.bomb_timer))]
+        terrain_added, terrain_added_by = 0, (0,) * len(self.player_slots)
+        track_owners = self.blast_owners is not None and len(blast_cells) > 0
+        if track_owners:
+            self._begin_owner_change(blast_cells)
+            # completed blasts on void become new land (blasts never cover blocks)
+            new_land = ((self.blast & BLAST_EXPLODE) != 0) & (self.board == 0)
+            terrain_added = int(np.count_nonzero(new_land))
+            terrain_added_by = tuple(np.count_nonzero(((self.blast_owners & BLAST_EXPLODE) != 0) & new_land,
+                                                      axis=(1, 2)).tolist())
+        if _advance_planes(self.board, self.bomb_timer, self.blast).any():
+            # blasts turned into new ground
+            self.terrain_counts = np.bincount(self.board.ravel(), minlength=3)
+            self._terrain_version += 1
+        if track_owners:
+            np.left_shift(self.blast_owners, 1, out=self.blast_owners)
+            self.blast_owners &= BLAST_MASK
+        for idx in changes:
+            self._end_change(idx)
+        return terrain_added, terrain_added_by
 
     def check_players_status(self):
         player_status = dict()
-        for player in self.players:
+        for slot, player in enumerate(self.players):
             player_r, player_c = player.position
             # if bomb detonation affects the player position
-            if 5 in self.movable_objects[player_r][player_c]:
+            if self.blast[player_r, player_c] & BLAST_EXPLODE and player.alive:
                 player.alive = False
+                if self.zobrist_hash is not None:
+                    self.zobrist_hash ^= self._zobrist_alive[slot]
+                if self._killed_by is not None:
+                    self._killed_by[slot] = tuple(
+                        owner + 1 for owner in np.flatnonzero(self.blast_owners[:, player_r, player_c] & BLAST_EXPLODE))
             player_status[player] = player.alive
         return player_status
 
@@ -254,105 +477,512 @@ class Game:
         assert self.frame > 0, 'Start the game first'
         assert None not in [value for key, value in
                             self.player_action_queue.items()], 'Not all player actions have been defined yet'
+        actions = [self.player_action_queue[player.name] for player in self.players]
+        for player in self.players:
+            # empty action queue
+            self.player_action_queue[player.name] = None
+        self._play_frame([None if action == 'bomb' else action for action in actions])
+        return True
 
+    def _play_frame(self, targets):
+        '''Play one frame; targets holds the tile every player moves to (in the order the players joined),
+        or None if the player drops a bomb.'''
+        # open a journal entry with the fields that are restored as a whole
+        if self._journal is not None:
+            self._changes = []
+            self._owner_changes = []
+            self._journal.append((self.frame, self.ended, self.terrain_counts, self.zobrist_hash,
+                                  [(player.position, player.alive) for player in self.players],
+                                  self.events, self._changes, self._owner_changes))
 
         # update frame
         self.frame += 1
+        self._state_version += 1
+        self._frame_changes = []
 
         # update blast radius
-        self._update_blast()
+        terrain_added, terrain_added_by = self._update_blast()
+        bombs_placed = [0] * len(self.players)
+        if self.events is not None:
+            self._killed_by = [()] * len(self.players)
 
         # update the player positions on the board
-        for player_name, action in self.player_action_queue.items():
-            # get player instance
-            player = self.player_name_to_object[player_name]
-
-            if isinstance(action, tuple):
+        for slot, (player, target) in enumerate(zip(self.players, targets)):
+            if target is None:
+                # drop bomb
+                self._bomb(player.position[0], player.position[1], slot=slot)
+                bombs_placed[slot] += 1
+            else:
                 # move player
-                new_position_r, new_position_c = action
-                self._move_player(new_position_r, new_position_c, player)
-            elif isinstance(action, str):
-                if action == 'bomb':
-                    # drop bomb
-                    self._bomb(player.position[0], player.position[1])
-            # empty action queue
-            self.player_action_queue[player_name] = None
+                self._move_player(target[0], target[1], player)
 
         # check if game ends (Player 1 win, Player 2 win, Draw)
         self.check_game_status()
-        return True
+        if self.events is not None:
+            self.events = FrameEvents(tuple(bombs_placed), terrain_added, terrain_added_by, tuple(self._killed_by))
+        self._last_changes = (self._state_version - 1, self._state_version, self._frame_changes)
+        self._changes = None
+        self._owner_changes = None
+        self._killed_by = None
+        self._frame_changes = None
+
+    def _target(self, player, action):
+        '''The tile a player moves to with an action code other than BOMB, on the current board.'''
+        if action == STILL:
+            return player.position
+        current_location_r, current_location_c = player.position
+        step_r, step_c = _ACTION_STEPS[action]
+        next_location_r, next_location_c = current_location_r + step_r, current_location_c + step_c
+
+        if not self._possible_move(next_location_r, next_location_c):
+            # The next step is not possible, stay in the current location
+            return player.position
+        return next_location_r, next_location_c
+
+    def _queue_action(self, player, action):
+        '''Queue an action code of a player for the next frame and save the move in the player history.'''
+        self.player_action_queue[player.name] = 'bomb' if action == BOMB else self._target(player, action)
+
+        # save move
+        if self.keep_history:
+            player.history.append(ACTIONS[action])
+
+    def reset(self):
+        '''Restart the game in place with the same players: restore the starting map, respawn the players,
+        clear their histories and assign a new game id. The game is started right away.
+        Returns the observation of the first frame (a copy of the state planes).'''
+        assert len(self.players) == len(self.player_slots), 'Not all players are loaded in yet.'
+        self.id = str(random_id_generator())
+        self.frame = 0
+        self.ended = False
+
+        # restore the starting map and respawn the players
+        self.planes[...] = 0
+        if self.events is not None:
+            self.blast_owners[...] = 0
+            self.events = _no_events(len(self.players))
+        self.board[...] = self.map_template.board
+        for slot, player in enumerate(self.players):
+            player.position = self.player_slots[slot]
+            player.alive = True
+            player.history = []
+            self.occupancy[player.position] |= 1 << slot
+            self.player_action_queue[player.name] = None
+
+        # reset the bookkeeping
+        self.terrain_counts = np.bincount(self.board.ravel(), minlength=3)
+        self._terrain_version += 1
+        if self.zobrist_hash is not None:
+            self.zobrist_hash = self._full_hash()
+        if self._journal is not None:
+            self._journal.clear()
+
+        self.start()
+        return self.planes.copy()
+
+    def step(self, actions):
+        '''Play one frame with an action code (see ACTIONS) for every player, in the order the players joined.
+        Returns the observation (a copy of the state planes), the rewards of the players, whether the game
+        ended and an info dictionary with the frame and the outcome code.'''
+        assert self.frame > 0, 'Start the game first'
+        assert not self.ended, 'The game has already ended. Use game.reset() to play again.'
+        assert len(actions) == len(self.players) and all(0 <= action < len(ACTIONS) for action in actions), \
+            'Expected one action code (0-{}) per player.'.format(len(ACTIONS) - 1)
+        # the moves are resolved on the board before the frame update, like the queued actions
+        targets = [None if action == BOMB else self._target(player, action)
+                   for player, action in zip(self.players, actions)]
+        if self.keep_history:
+            for player, action in zip(self.players, actions):
+                player.history.append(ACTIONS[action])
+        self._play_frame(targets)
+        return self.planes.copy(), self.terminal_rewards(), self.ended, {'frame': self.frame,
+                                                                         'outcome': self.outcome}
+
+    def observe(self, player=0, out=None, dtype=np.uint8):
+        '''Return the one-hot (channels, rows, columns) observation of the current frame (see OBSERVATION_CHANNELS)
+        from the perspective of a player (index in the order the players joined). The observation is written
+        into `out` if given, e.g. a reused uint8 or float32 buffer.'''
+        if out is None:
+            out = np.empty((len(OBSERVATION_CHANNELS),) + self.board.shape, dtype=dtype)
+        return _observe(self.planes, player, out)
+
+    def terminal_rewards(self):
+        '''The rewards of the players: 1 for the winner, -1 for the others (a draw is a loss too)
+        and 0 while the game is ongoing.'''
+        rewards = np.zeros(len(self.players))
+        outcome = self.outcome
+        if outcome != ONGOING:
+            rewards[:] = -1
+            if outcome != DRAW:
+                rewards[outcome - 1] = 1
+        return rewards
+
+    def enable_undo(self, max_frames=None):
+        '''Keep a journal of the cells and player fields changed by every frame update (of at most
+        max_frames frames), so that undo() can roll the frames back in place.'''
+        self._journal = deque(maxlen=max_frames)
+
+    def disable_undo(self):
+        self._journal = None
+
+    def enable_events(self):
+        '''Count what happens in every frame update in self.events (see FrameEvents). This keeps a blast plane
+        per player slot to tell whose blasts turned tiles into land or killed a player; blasts already on the
+        board have no owner.'''
+        if self.events is None:
+            self.blast_owners = np.zeros((len(self.player_slots),) + self.board.shape, dtype=np.uint8)
+            self.events = _no_events(len(self.player_slots))
+
+    def disable_events(self):
+        self.blast_owners = None
+        self.events = None
+
+    def enable_hashing(self):
+        '''Keep the zobrist hash of the state (see zobrist_hash) up to date as the game runs.'''
+        self._zobrist_keys, self._zobrist_alive = _zobrist_tables(self.board.shape, len(self.player_slots))
+        self.zobrist_hash = self._full_hash()
+
+    def disable_hashing(self):
+        self.zobrist_hash = None
+
+    def undo(self, frames=1):
+        '''Roll back the last frame update(s) in place. Queued player actions are dropped;
+        the player histories are left untouched.'''
+        assert self._journal is not None, 'Enable the undo journal first with game.enable_undo().'
+        assert frames <= len(self._journal), 'The undo journal holds only {} frames.'.format(len(self._journal))
+        hashing = self.zobrist_hash is not None
+        for _ in range(frames):
+            frame, ended, terrain_counts, zobrist_hash, players, events, changes, owner_changes = self._journal.pop()
+            for idx, values in reversed(changes):
+                self._flat_planes[idx] = values
+            if self.blast_owners is not None:
+                for cells, values in reversed(owner_changes):
+                    self.blast_owners.reshape(len(self.blast_owners), -1)[:, cells] = values
+            if terrain_counts is not self.terrain_counts:
+                self.terrain_counts = terrain_counts
+                self._terrain_version += 1
+            self.frame = frame
+            self.ended = ended
+            self.zobrist_hash = zobrist_hash
+            if self.events is not None:
+                # the frames may have been played before the events were enabled
+                self.events = _no_events(len(self.players)) if events is None else events
+            for player, (position, alive) in zip(self.players, players):
+                player.position = position
+                player.alive = alive
+                self.player_action_queue[player.name] = None
+        if not hashing:
+            self.zobrist_hash = None
+        elif self.zobrist_hash is None:
+            # the frames were played before hashing was enabled
+            self.zobrist_hash = self._full_hash()
+        self._state_version += 1
+
+    def undo_to(self, frame):
+        '''Roll back to an earlier frame in the undo journal.'''
+        assert frame <= self.frame, 'Frame {} is in the future.'.format(frame)
+        self.undo(self.frame - frame)
+
+    def snapshot(self):
+        '''Return the current state as an immutable GameState.'''
+        return GameState(self.frame, self.ended, self.planes.tobytes(),
+                         tuple(player.position for player in self.players),
+                         tuple(player.alive for player in self.players),
+                         None if self.blast_owners is None else self.blast_owners.tobytes())
+
+    def restore(self, state):
+        '''Restore a state taken with snapshot() in place. Queued player actions are dropped.'''
+        self.planes[...] = np.frombuffer(state.planes, dtype=np.uint8).reshape(self.planes.shape)
+        if self.events is not None:
+            # the blasts of a state taken without events have no owner
+            self.blast_owners[...] = 0 if state.blast_owners is None else \
+                np.frombuffer(state.blast_owners, dtype=np.uint8).reshape(self.blast_owners.shape)
+            self.events = _no_events(len(self.players))
+        self.frame = state.frame
+        self.ended = state.ended
+        for player, position, alive in zip(self.players, state.positions, state.alive):
+            player.position = position
+            player.alive = alive
+            self.player_action_queue[player.name] = None
+
+        # the undo journal does not apply to the restored state
+        if self._journal is not None:
+            self._journal.clear()
+
+        # the terrain may have changed
+        self.terrain_counts = np.bincount(self.board.ravel(), minlength=3)
+        self._terrain_version += 1
+        self._state_version += 1
+        if self.zobrist_hash is not None:
+            self.zobrist_hash = self._full_hash()
+
+    def clone(self, state=None):
+        '''Return an independent copy of the game (at the given state, if any) without rebuilding the map.
+        The copy keeps the game id and has its own copies of the players.'''
+        game = Game.__new__(Game)
+        game.__dict__.update(self.__dict__)
+        game.planes = self.planes.copy()
+        game._bind_planes()
+        if self.blast_owners is not None:
+            game.blast_owners = self.blast_owners.copy()
+        game.terrain_counts = self.terrain_counts.copy()
+        game._terrain_positions = dict(self._terrain_positions)
+        game._status = None
+        game._journal = None
+        game._last_changes = None
+
+        # copy the players
+        game.players = []
+        game.player_name_to_object = dict()
+        game.player_action_queue = dict(self.player_action_queue)
+        for player in self.players:
+            player_copy = Player.__new__(Player)
+            player_copy.__dict__.update(player.__dict__)
+            player_copy.game = game
+            player_copy.history = list(player.history)
+            game.players.append(player_copy)
+            game.player_name_to_object[player_copy.name] = player_copy
+
+        if state is not None:
+            game.restore(state)
+        return game
+
+    @property
+    def outcome(self):
+        '''The outcome code of the game: ONGOING, DRAW or the number of the winning player.'''
+        if not self.ended:
+            return ONGOING
+        outcome = DRAW
+        for player in self.players:
+            if player.alive:
+                outcome = -player.id
+        return outcome
+
+    @property
+    def state_version(self):
+        '''A counter that changes whenever the state changes.'''
+        return self._state_version
+
+    def changed_cells(self, since_version):
+        '''The flat indices of the tiles that changed since a state version, or None if they are not known
+        (only the last frame update is tracked; a reset, undo or restore changes everything).'''
+        if since_version == self._state_version:
+            return np.zeros(0, dtype=np.intp)
+        if self._last_changes is None or self._last_changes[:2] != (since_version, self._state_version):
+            return None
+        if not self._last_changes[2]:
+            return np.zeros(0, dtype=np.intp)
+        return np.unique(np.concatenate(self._last_changes[2]) % self.board.size)
+
+    def terrain_positions(self, terrain):
+        '''The (row, column) array of all tiles of a terrain type. Cached until the terrain changes.'''
+        key = (self._terrain_version, terrain)
+        if key not in self._terrain_positions:
+            self._terrain_positions = {k: v for k, v in self._terrain_positions.items()
+                                       if k[0] == self._terrain_version}
+            self._terrain_positions[key] = np.argwhere(self.board == terrain)
+        return self._terrain_positions[key]
+
+    @property
+    def status(self):
+        '''Lazy status view of the current frame (see GameStatus).'''
+        if self._status is None or self._status.version != self._state_version:
+            self._status = GameStatus(self)
+        return self._status
 
     def get_status_dict(self):
+        return self.status.to_dict()
+
+
+class GameStatus:
+
+    def __init__(self, game):
+        '''Lazy view on the status of a game at the current frame. The position arrays are only
+        computed when they are requested; the view becomes stale once the game advances.'''
+        self.game = game
+        self.version = game._state_version
+        self.id = game.id
+        self.frame = game.frame
+        self.board_dimensions = game.board.shape
+        self._cache = dict()
+
+    def _cached(self, key, compute):
+        assert self.version == self.game._state_version, 'The game has advanced since this status was taken.'
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    @property
+    def outcome(self):
+        '''The outcome as 'ongoing', 'draw' or 'player_{number}'.'''
+        outcome = self._cached('outcome', lambda: self.game.outcome)
+        if outcome == ONGOING:
+            return 'ongoing'
+        if outcome == DRAW:
+            return 'draw'
+        return 'player_{}'.format(outcome)
+
+    @property
+    def players(self):
+        return self._cached('players', lambda: {'player_{}'.format(-player.id): player.position
+                                                for player in self.game.players})
+
+    @property
+    def void(self):
+        return self._cached('void', lambda: self.game.terrain_positions(0))
+
+    @property
+    def land(self):
+        return self._cached('land', lambda: self.game.terrain_positions(1))
+
+    @property
+    def block(self):
+        return self._cached('block', lambda: self.game.terrain_positions(2))
+
+    @property
+    def n_void(self):
+        return self._cached('n_void', lambda: int(self.game.terrain_counts[0]))
+
+    @property
+    def n_land(self):
+        return self._cached('n_land', lambda: int(self.game.terrain_counts[1]))
+
+    @property
+    def n_block(self):
+        return self._cached('n_block', lambda: int(self.game.terrain_counts[2]))
+
+    @property
+    def bombs_and_stage(self):
+        '''The (row, column, stage) array of all bombs.'''
+        def compute():
+            bomb_r, bomb_c = np.nonzero(self.game.bomb_timer)
+            return np.stack([bomb_r, bomb_c, self.game.bomb_timer[bomb_r, bomb_c]], axis=1)
+        return self._cached('bombs_and_stage', compute)
+
+    def blast_radius(self, stage):
+        '''The (row, column) array of all tiles in blast stage 1-4.'''
+        return self._cached(('blast_radius', stage),
+                            lambda: np.argwhere(self.game.blast & (1 << (stage - 1))))
+
+    def to_dict(self):
+        '''The status in the dictionary format of Game.get_status_dict.'''
         d = {}
 
         ## GAME PROPERTIES ##
-        d['game_properties'] = {}
+        d['game_properties'] = {'id': self.id,
+                                'board_dimensions': self.board_dimensions,
+                                'outcome': self.outcome,
+                                'frame': self.frame}
 
-        # add game id
-        d['game_properties']['id'] = self.id
+        ## BOARD POSITIONS ##
+        d['board_positions'] = {'players': dict(self.players)}
+        for field in ['void', 'land', 'block', 'bombs_and_stage']:
+            d['board_positions'][field] = [tuple(x) for x in getattr(self, field).tolist()]
+        for stage in [1, 2, 3, 4]:
+            d['board_positions']['blast_radius_{}'.format(stage)] = [tuple(x) for x in
+                                                                     self.blast_radius(stage).tolist()]
+        return d
 
-        # add board dimensions
-        d['game_properties']['board_dimensions'] = self.board.shape
 
-        # add game status
-        if self.ended:
-            draw = True
-            for player in self.players:
-                if player.alive:
-                    d['game_properties']['outcome'] = 'player_{}'.format(-player.id)
-                    draw = False
-            if draw:
-                d['game_properties']['outcome'] = 'draw'
-        else:
-            d['game_properties']['outcome'] = 'ongoing'
-
-        # add frame
-        d['game_properties']['frame'] = self.frame
+class VectorGame:
 
-        ## BOARD POSITIONS ##
-        d['board_positions'] = {}
+    def __init__(self, n_games, map_scheme):
+        '''Initialize N independent games on the same map. The games are stored as stacked state planes
+        and are stepped in lockstep with batched array operations.'''
+        self.n_games = n_games
+        self.map_scheme = map_scheme
 
-        # add player positions
-        d['board_positions']['players'] = {}
-        for player in self.players:
-            d['board_positions']['players']['player_{}'.format(-player.id)] = player.position
-
-        # add void positions
-        void_pos = np.where(self.board == 0)
-        d['board_positions']['void'] = [(void_pos[0][idx], void_pos[1][idx]) for idx in range(len(void_pos[0]))]
-
-        # add land positions
-        land_pos = np.where(self.board == 1)
-        d['board_positions']['land'] = [(land_pos[0][idx], land_pos[1][idx]) for idx in range(len(land_pos[0]))]
-
-        # add block positions
-        block_pos = np.where(self.board == 2)
-        d['board_positions']['block'] = [(block_pos[0][idx], block_pos[1][idx]) for idx in range(len(block_pos[0]))]
-
-        # add bomb positions and set stage
-        bomb_pos = []
-        for r in self._bomb_dict.keys():
-            for c in self._bomb_dict[r].keys():
-                stage = self._bomb_dict[r][c]
-                # if there is a bomb, save the stage
-                if stage >= 1:
-                    bomb_pos.append((r, c, stage))
-        d['board_positions']['bombs_and_stage'] = bomb_pos
-
-        # add blast radius and stage
-        for blast_stage in [2, 3, 4, 5]:
-            # create field
-            field = 'blast_radius_{}'.format(blast_stage - 1)
-            d['board_positions'][field] = []
-
-            # check where to find this blast stage
-            for r in self.movable_objects.keys():
-                for c in self.movable_objects[r].keys():
-                    # if this particular blast stage is found
-                    if blast_stage in self.movable_objects[r][c]:
-                        d['board_positions'][field].append((r, c))
+        ## build the starting state from the compiled map ##
+        template = compile_map_scheme(map_scheme)
+        self.n_players = len(template.player_slots)
+        self.player_slots = np.array(template.player_slots)
+        self._initial_planes = np.zeros((N_PLANES,) + template.board.shape, dtype=np.uint8)
+        self._initial_planes[TERRAIN] = template.board
+        for slot, (r, c) in enumerate(template.player_slots):
+            self._initial_planes[OCCUPANCY, r, c] |= 1 << slot
+
+        ## blast planes of a bomb on every tile (blocks never change, so this is fixed per map) ##
+        self._blast_masks = _blast_masks(template.board, blast_range=2)
+
+        ## stacked state ##
+        self.planes = np.empty((n_games,) + self._initial_planes.shape, dtype=np.uint8)
+        self.board = self.planes[:, TERRAIN]
+        self.bomb_timer = self.planes[:, BOMB_TIMER]
+        self.blast = self.planes[:, BLAST]
+        self.occupancy = self.planes[:, OCCUPANCY]
+        self.positions = np.empty((n_games, self.n_players, 2), dtype=np.intp)
+        self.alive = np.empty((n_games, self.n_players), dtype=bool)
+        self.frame = np.empty(n_games, dtype=np.int64)
+
+        self._reset(slice(None))
+
+    def reset(self, games=None):
+        '''Restart the selected games (all by default) from the starting state and return the observations.'''
+        self._reset(slice(None) if games is None else games)
+        return self.planes.copy()
+
+    def _reset(self, games):
+        self.planes[games] = self._initial_planes
+        self.positions[games] = self.player_slots
+        self.alive[games] = True
+        # games are started right away
+        self.frame[games] = 1
+
+    def observe(self, player=0, out=None, dtype=np.uint8):
+        '''Return the one-hot (n_games, channels, rows, columns) observations of a player (see Game.observe).'''
+        if out is None:
+            out = np.empty((self.n_games, len(OBSERVATION_CHANNELS)) + self.board.shape[1:], dtype=dtype)
+        return _observe(self.planes, player, out)
+
+    def step(self, actions):
+        '''Play one frame in every game. The actions are an (n_games, n_players) array of action codes.
+        Returns the observations, the outcomes and the terminal flags; finished games are restarted.'''
+        actions = np.asarray(actions)
+        assert actions.shape == (self.n_games, self.n_players), \
+            'Expected actions of shape {}'.format((self.n_games, self.n_players))
+        games = np.arange(self.n_games)[:, None]
+        n_rows, n_columns = self.board.shape[1:]
+
+        # resolve the moves on the current board (like the Player actions do before the frame update)
+        target = self.positions + ACTION_OFFSETS[actions]
+        target_r, target_c = target[..., 0], target[..., 1]
+        inside = (target_r >= 0) & (target_r < n_rows) & (target_c >= 0) & (target_c < n_columns)
+        target_r, target_c = np.clip(target_r, 0, n_rows - 1), np.clip(target_c, 0, n_columns - 1)
+        possible = inside & (self.board[games, target_r, target_c] == 1) & \
+                   (self.bomb_timer[games, target_r, target_c] == 0)
 
-        return d
+        # update frame
+        self.frame += 1
+
+        # update blast radius
+        _advance_planes(self.board, self.bomb_timer, self.blast)
+
+        # drop bombs (bombing players do not move)
+        bombing = actions == BOMB
+        for slot in range(self.n_players):
+            bombers = np.flatnonzero(bombing[:, slot])
+            if len(bombers):
+                bomb_r, bomb_c = self.positions[bombers, slot, 0], self.positions[bombers, slot, 1]
+                self.bomb_timer[bombers, bomb_r, bomb_c] = 1
+                self.blast[bombers] |= self._blast_masks[bomb_r * n_columns + bomb_c]
+
+        # move the players
+        self.positions[possible] = target[possible]
+        self.occupancy[:] = 0
+        for slot in range(self.n_players):
+            self.occupancy[games[:, 0], self.positions[:, slot, 0], self.positions[:, slot, 1]] |= 1 << slot
+
+        # check the player and game status
+        positions_r, positions_c = self.positions[..., 0], self.positions[..., 1]
+        self.alive &= (self.blast[games, positions_r, positions_c] & BLAST_EXPLODE) == 0
+        n_alive = self.alive.sum(axis=1)
+        dones = n_alive <= 1
+        outcomes = np.where(dones, np.where(n_alive == 1, self.alive.argmax(axis=1) + 1, DRAW), ONGOING)
+
+        # restart the finished games
+        if dones.any():
+            self._reset(dones)
+        return self.planes.copy(), outcomes, dones
 
 
 def validate(func):
@@ -380,83 +1010,24 @@ class Player:
 
     @validate
     def Up(self):
-        current_location_r, current_location_c = self.position
-        next_location_r, next_location_c = current_location_r - 1, current_location_c
-
-        if not self.game._possible_move(next_location_r, next_location_c):
-            # The next step is not possible, stay in the current location
-            next_location_c = current_location_c
-            next_location_r = current_location_r
-
-        # add next to queue
-        self.game.player_action_queue[self.name] = (next_location_r, next_location_c)
-
-        # save move
-        self.history.append('up')
+        self.game._queue_action(self, UP)
 
     @validate
     def Down(self):
-        current_location_r, current_location_c = self.position
-        next_location_r, next_location_c = current_location_r + 1, current_location_c
-
-        if not self.game._possible_move(next_location_r, next_location_c):
-            # The next step is not possible, stay in the current location
-            next_location_c = current_location_c
-            next_location_r = current_location_r
-
-        # add next to queue
-        self.game.player_action_queue[self.name] = (next_location_r, next_location_c)
-
-        # save move
-        self.history.append('down')
+        self.game._queue_action(self, DOWN)
 
     @validate
     def Left(self):
-        current_location_r, current_location_c = self.position
-        next_location_r, next_location_c = current_location_r, current_location_c - 1
-
-        if not self.game._possible_move(next_location_r, next_location_c):
-            # The next step is not possible, stay in the current location
-            next_location_c = current_location_c
-            next_location_r = current_location_r
-
-        # add next to queue
-        self.game.player_action_queue[self.name] = (next_location_r, next_location_c)
-
-        # save move
-        self.history.append('left')
+        self.game._queue_action(self, LEFT)
 
     @validate
     def Right(self):
-        current_location_r, current_location_c = self.position
-        next_location_r, next_location_c = current_location_r, current_location_c + 1
-
-        if not self.game._possible_move(next_location_r, next_location_c):
-            # The next step is not possible, stay in the current location
-            next_location_c = current_location_c
-            next_location_r = current_location_r
-
-        # add next to queue
-        self.game.player_action_queue[self.name] = (next_location_r, next_location_c)
-
-        # save move
-        self.history.append('right')
+        self.game._queue_action(self, RIGHT)
 
     @validate
     def Still(self):
-        current_location_r, current_location_c = self.position
-        next_location_r, next_location_c = current_location_r, current_location_c
-
-        # add next to queue
-        self.game.player_action_queue[self.name] = (next_location_r, next_location_c)
-
-        # save move
-        self.history.append('still')
+        self.game._queue_action(self, STILL)
 
     @validate
     def Bomb(self):
-        # add next to queue
-        self.game.player_action_queue[self.name] = 'bomb'
-
-        # save move
-        self.history.append('bomb')
\ No newline at end of file
+        self.game._queue_action(self, BOMB)
@@ -1,9 +1,32 @@
-from game import Game, Player
-from render_tool import RenderTool, MapScheme
+from game import Game, Player, STILL, UP, DOWN, LEFT, RIGHT, BOMB
+from render_tool import RenderTool, MediaRecorder, MapScheme
 
+from concurrent.futures import ThreadPoolExecutor
 import cv2
-import traceback
 import random
+import time
+
+TICK_RATE = 2 # frames per second; the game advances on every tick, with or without input
+RECORD = False # save a video of the game in data/{game_id}/
+
+# key codes of the controls
+KEYS = {119: UP, # W key (change to 122 (Z) on azerty keyboards)
+        115: DOWN, # S key
+        97: LEFT, # A key (change to 113 (Q) on azerty keyboards)
+        100: RIGHT, # D key
+        32: BOMB} # SPACE BAR
+ESCAPE = 27
+
+
+def bot_action(game):
+    '''Choose a random action for the other player (minus bomb to make sure that player2 does not blow itself up).'''
+    return random.choice([STILL, UP, DOWN, LEFT, RIGHT])
+
+
+def show(window, RT):
+    # the frame is shown straight from the renderer
+    cv2.imshow(window, cv2.cvtColor(RT.update_pixels(), cv2.COLOR_RGBA2BGR))
+
 
 # choose the map
 map = MapScheme().standard
@@ -15,53 +38,51 @@ RT = RenderTool(game)
 player1 = Player(game, 'player1')
 player2 = Player(game, 'player2')
 
-if game.start():
-    img = RT.render_current_frame(save_media=True)
+game.start()
+recorder = MediaRecorder(game) if RECORD else None
+bot = ThreadPoolExecutor(max_workers=1)
 
-img = cv2.imread(RT.image_path + '{}.png'.format(game.frame))
 cv2.namedWindow(game.id)
-cv2.imshow(game.id, img)
+escaped = False
+while not game.ended:
+    show(game.id, RT)
+    if recorder is not None:
+        recorder.record()
 
-while 1:
-    # the pressed key
-    k = cv2.waitKey(0)
-    if k == 27: # ESCAPE KEY
+    # the bot thinks while the player picks a move (the game does not change until the end of the tick)
+    bot_move = bot.submit(bot_action, game)
+
+    # collect input until the next tick; the last recognized key counts
+    action = STILL
+    tick_end = time.time() + 1.0 / TICK_RATE
+    while time.time() < tick_end:
+        k = cv2.waitKey(max(1, int((tick_end - time.time()) * 1000)))
+        if k == -1:
+            # no key pressed
+            continue
+        k &= 0xFF
+        if k == ESCAPE:
+            escaped = True
+            break
+        elif k in KEYS:
+            action = KEYS[k]
+        else:
+            print("Not recognized key {} pressed..".format(k))
+    if escaped:
         print('Escape key pressed. Closing game..')
         break
-    else:
-        # UP (W key)
-        if k == 119: # change to 122 (Z) on azerty keyboards
-            player1.Up()
-        # DOWN (S Key)
-        elif k == 115:
-            player1.Down()
-        # LEFT (A key)
-        elif k == 97: # change to 113 (Q) on azerty keyboards
-            player1.Left()
-        # RIGHT (D key)
-        elif k == 100:
-            player1.Right()
-
-
-        # BOMB (SPACE BAR)
-        elif k == 32:
-            player1.Bomb()
-
-        # If any other key is pressed (by accident), we stand still
-        else:
-            print("Not recognized key {} pressed. Standing still for this action..".format(k))
-            player1.Still()
-
-        # choose a random action for the other player (minus bomb to make sure that player2 does not blow itself up)
-        move_func = random.choice([player2.Still, player2.Up, player2.Down, player2.Left, player2.Right])
-        move_func()
-
-        try:
-            game.update_frame()
-            RT.render_current_frame(save_media=True)
-            img = cv2.imread(RT.image_path + '{}.png'.format(game.frame))
-            cv2.imshow(game.id, img)
-        except Exception as exc:
-            print(exc)
-            print(traceback.format_exc())
-            break
\ No newline at end of file
+
+    game.step([action, bot_move.result()])
+
+# show the final frame
+if game.ended:
+    show(game.id, RT)
+    if recorder is not None:
+        recorder.record()
+    print('Game over: {}. Press any key to close..'.format(game.status.outcome))
+    cv2.waitKey(0)
+
+bot.shutdown()
+if recorder is not None:
+    recorder.close()
+cv2.destroyAllWindows()
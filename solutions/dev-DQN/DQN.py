@@ -2,9 +2,9 @@
 
 # source files
 from settings import *
+from replay_buffer import ReplayBuffer, PrioritizedReplayBuffer, MemmapReplayBuffer
 
 # standard libraries
-from collections import deque
 import random
 
 # additional libraries
@@ -20,9 +20,11 @@ from keras.layers import Flatten
 
 class DQN_RL:
 
-    def __init__(self):
-        '''Initialize the DQN RL agent.'''
-        self.q_table = deque(maxlen=5000)  # i.e. the "training" data
+    def __init__(self, replay_memory_path=None):
+        '''Initialize the DQN RL agent. With a replay_memory_path, the replay memory is kept in (and reopened
+        from) that file.'''
+        self.q_table = None  # i.e. the "training" data (the replay memory is allocated in buildCNN)
+        self.replay_memory_path = replay_memory_path
         self.epsilon = EPSILON # the curiosity parameter (i.e. fraction of random action sampling)
 
     def initialize_actions(self, actions_dict):
@@ -37,9 +39,9 @@ class DQN_RL:
         self.int2actions = {self.actions.index(x): x for x in self.actions}
         self.actions2int = {x: self.actions.index(x) for x in self.actions}
 
-    def buildCNN(self, game_obj, input_img_height, input_img_width):
+    def buildCNN(self, game_obj, input_img_height, input_img_width, input_channels=1):
         '''Build the CNN to be able to read the state of the game the same way the user can,
-        i.e. visually.'''
+        i.e. visually. With one input pixel per tile (the engine observation), a kernel is one tile.'''
         # initialize a sequential model
         self.model = Sequential()
 
@@ -48,12 +50,13 @@ class DQN_RL:
                        int(input_img_height / game_obj.board.shape[0])) # kernel height
         pixels_in_image = game_obj.board.shape[0] * game_obj.board.shape[1]
 
-        self.model.add(Conv2D(pixels_in_image, kernel_size, input_shape=(input_img_height, input_img_width, 1),
+        self.model.add(Conv2D(pixels_in_image, kernel_size,
+                              input_shape=(input_img_height, input_img_width, input_channels),
                               strides=int(input_img_width / game_obj.board.shape[1]), activation='relu'))
 
         # attempt to shape a combination of tiles as a kernel
         self.model.add(Conv2D(int(pixels_in_image // 4), kernel_size=(5, 5),
-                              input_shape=(input_img_height, input_img_width, 1),
+                              input_shape=(input_img_height, input_img_width, input_channels),
                               activation='relu'))
 
         # flatten the convolution layers
@@ -70,6 +73,18 @@ class DQN_RL:
         self.model.compile(loss='mse',
                            optimizer=Adam(lr=LEARNING_RATE))
 
+        # the replay memory for states of the input shape (one-hot engine states fit in uint8)
+        state_shape = (input_img_height, input_img_width, input_channels)
+        state_dtype = np.uint8 if STATE_FROM_ENGINE else np.float32
+        if self.replay_memory_path is not None:
+            assert not PRIORITIZED_REPLAY, 'Prioritized replay is not supported for a replay memory on disk.'
+            self.q_table = MemmapReplayBuffer(self.replay_memory_path, REPLAY_MEMORY_SIZE, state_shape, state_dtype)
+        elif PRIORITIZED_REPLAY:
+            self.q_table = PrioritizedReplayBuffer(REPLAY_MEMORY_SIZE, state_shape, state_dtype, alpha=PRIORITY_ALPHA,
+                                                   beta=PRIORITY_BETA, beta_increment=PRIORITY_BETA_INCREMENT)
+        else:
+            self.q_table = ReplayBuffer(REPLAY_MEMORY_SIZE, state_shape, state_dtype)
+
     def act(self, state, epsilon=None):
         '''Generate the action given the current game state,
         while applying a curiosity parameter (gamma).'''
@@ -92,22 +107,30 @@ class DQN_RL:
     def save_state(self, last_state, action, reward, new_state, done):
         '''Add the last state, the action, and its effect (reward, new state,
         and whether the game is over) to the Q-table.'''
-        self.q_table.append((last_state, action, reward, new_state, done))
+        self.q_table.add(last_state, self.actions2int[action], reward, new_state, done)
 
     def reinforce(self):
         '''Apply the core reinforcement learning algorithm to the collected data.'''
-        # reinforce based on randomly sampled data
-        minibatch = random.sample(self.q_table, BATCH_SIZE)
-        for last_state, action, reward, new_state, done in minibatch:
-            if not done:
-                # Bellman equation for the Q function (only when game is in progress)
-                reward = (reward + GAMMA * np.amax(self.model.predict(new_state)[0]))
-            # request the predicted rewards
-            predicted_rewards = self.model.predict(last_state)
-            # adjust the predicted rewards with the known actual reward
-            predicted_rewards[0][self.actions2int[action]] = reward
-            # fit the model with the adjusted rewards (~ until convergence)
-            self.model.fit(last_state, predicted_rewards, epochs=1, verbose=0)
+        # reinforce based on randomly sampled data (informative transitions first with prioritized replay)
+        if PRIORITIZED_REPLAY:
+            slots, weights, (last_states, actions, rewards, new_states, dones) = \
+                self.q_table.sample_with_weights(BATCH_SIZE)
+        else:
+            weights = None
+            last_states, actions, rewards, new_states, dones = self.q_table.sample(BATCH_SIZE)
+
+        # Bellman equation for the Q function (only when game is in progress)
+        targets = np.where(dones, rewards, rewards + GAMMA * np.amax(self.model.predict(new_states), axis=1))
+        # request the predicted rewards
+        predicted_rewards = self.model.predict(last_states)
+        # adjust the predicted rewards with the known actual rewards
+        td_errors = targets - predicted_rewards[np.arange(BATCH_SIZE), actions]
+        predicted_rewards[np.arange(BATCH_SIZE), actions] = targets
+        # fit the model with the adjusted rewards in one step
+        self.model.train_on_batch(last_states, predicted_rewards, sample_weight=weights)
+
+        if PRIORITIZED_REPLAY:
+            self.q_table.update_priorities(slots, td_errors)
 
         # decrease the curiosity parameter as we have seen more data
         if self.epsilon > EPSILON_MIN:
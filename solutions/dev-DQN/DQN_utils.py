@@ -20,4 +20,10 @@ def reshape_state(img, new_height, new_width):
     resized_gray_normalized = resized_gray / 255.0
     # reshape for the network
     reshaped = resized_gray_normalized.reshape(1, new_height, new_width, 1)
-    return reshaped
\ No newline at end of file
+    return reshaped
+
+
+def reshape_observation(observation):
+    '''Reshape an observation of the game engine (channels, rows, columns) to have the correct input
+    properties for the neural network.'''
+    return observation.transpose(1, 2, 0).reshape((1,) + observation.shape[1:] + observation.shape[:1])
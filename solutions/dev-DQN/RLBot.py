@@ -1,153 +1,173 @@
 # source imports
-from game import Game, Player
-from render_tool import RenderTool, MapScheme
+from game import Game, Player, OBSERVATION_CHANNELS, ONGOING
+from render_tool import RenderTool, MediaRecorder, MapScheme
 
 # DQN imports
 from settings import * # the config file
 from DQN import DQN_RL # the agent
-from DQN_utils import reshape_state
-from reward import calculate_reward, calculate_bombs_placed, calculate_terrain_added
+from DQN_utils import reshape_state, reshape_observation
+from reward import calculate_reward
 
 # additional library imports
+import os
 import math
 import random
 import pandas as pd
 import numpy as np
 
 # dev imports
-from utils import save_dict
+from trajectory import TrajectoryWriter
 from tqdm import tqdm
 
 RL_performance = []
 
-# initialize the agent
-agent_player1 = DQN_RL()
-agent_player2 = DQN_RL()
 
-# start
-for e in tqdm(range(EPISODES)):
-    # choose the map
-    # map = MapScheme().IBM
-    map = MapScheme().standard
-
-    # initialize the game
-    game = Game(map, verbose=False)
-    RT = RenderTool(game)
-
-    # name the players
-    player1 = Player(game, 'Sonic')
-    player2 = Player(game, 'Knuckles')
-
-    # initialize the action space
-    agent_player1.initialize_actions(actions_dict={'Up': player1.Up,
-                                                   'Down': player1.Down,
-                                                   'Left': player1.Left,
-                                                   'Right': player1.Right,
-                                                   #'Still': player1.Still,
-                                                   'Bomb': player1.Bomb})
-    agent_player2.initialize_actions(actions_dict={'Up': player2.Up,
-                                                   'Down': player2.Down,
-                                                   'Left': player2.Left,
-                                                   'Right': player2.Right,
-                                                   #'Still': player2.Still,
-                                                   'Bomb': player2.Bomb})
-
-    # calculate the properties of the input images
+def get_states(game, RT, input_image_height, input_image_width):
+    '''Return the current state of the game as seen by player 1 and player 2.'''
+    # the media is saved in the background
+    if SAVE_MEDIA:
+        recorder.record()
+
+    if STATE_FROM_ENGINE:
+        return [reshape_observation(game.observe(player, dtype=np.float32)) for player in range(2)]
+
+    # render the frame
+    frame = np.array(RT.render_current_frame(save_media=False))
+
+    # reshape the frame (= the state)
+    state = reshape_state(frame, new_height=input_image_height, new_width=input_image_width)
+    return [state, state]
+
+
+# choose the map
+# map = MapScheme().IBM
+map = MapScheme().standard
+
+# initialize the game (the game, the players and the render tool are reused for every episode)
+game = Game(map, verbose=False)
+game.enable_events()  # the rewards are computed from the event counters
+RT = RenderTool(game)
+
+# name the players
+player1 = Player(game, 'Sonic')
+player2 = Player(game, 'Knuckles')
+
+# save the media without blocking the training loop
+recorder = MediaRecorder(game) if SAVE_MEDIA else None
+
+# initialize the agent
+if REPLAY_MEMORY_ON_DISK:
+    os.makedirs('replay', exist_ok=True)
+    agent_player1 = DQN_RL(replay_memory_path='replay/player1.bin')
+    agent_player2 = DQN_RL(replay_memory_path='replay/player2.bin')
+else:
+    agent_player1 = DQN_RL()
+    agent_player2 = DQN_RL()
+
+# initialize the action space
+agent_player1.initialize_actions(actions_dict={'Up': player1.Up,
+                                               'Down': player1.Down,
+                                               'Left': player1.Left,
+                                               'Right': player1.Right,
+                                               #'Still': player1.Still,
+                                               'Bomb': player1.Bomb})
+agent_player2.initialize_actions(actions_dict={'Up': player2.Up,
+                                               'Down': player2.Down,
+                                               'Left': player2.Left,
+                                               'Right': player2.Right,
+                                               #'Still': player2.Still,
+                                               'Bomb': player2.Bomb})
+
+# calculate the properties of the input images
+if STATE_FROM_ENGINE:
+    # one pixel per tile with one channel per observation channel
+    input_image_height, input_image_width = game.board.shape
+    input_channels = len(OBSERVATION_CHANNELS)
+else:
     pixel_height_tile = math.ceil(math.sqrt(PIXELS_PER_TILE))
     pixel_width_tile = pixel_height_tile
     input_image_height = pixel_height_tile * game.board.shape[0]
     input_image_width = pixel_width_tile * game.board.shape[1]
+    input_channels = 1
 
-    # build the CNN
-    agent_player1.buildCNN(game, input_image_height, input_image_width)
-    agent_player2.buildCNN(game, input_image_height, input_image_width)
+# build the CNN
+agent_player1.buildCNN(game, input_image_height, input_image_width, input_channels)
+agent_player2.buildCNN(game, input_image_height, input_image_width, input_channels)
 
-    # start the game (frame 1)
-    if game.start():
-        # update the frame
-        game_status_dict = game.get_status_dict()
-        save_dict('data/{}/{}.pickle'.format(game.id, game.frame), game_status_dict)
+# start
+for e in tqdm(range(EPISODES)):
+    # start a new game in place (frame 1)
+    game.reset()
+    os.makedirs('data/{}'.format(game.id), exist_ok=True)
+    trajectory = TrajectoryWriter.for_game('data/{}/trajectory.bin'.format(game.id), game)
 
-        # render the frame
-        frame = np.array(RT.render_current_frame(SAVE_MEDIA))
+    # update the frame
+    trajectory.write(game)
 
-        # reshape the frame (= the state)
-        new_state = reshape_state(frame, new_height=input_image_height, new_width=input_image_width)
+    # the state of each player
+    new_states = get_states(game, RT, input_image_height, input_image_width)
 
-        # cumulative reward
-        cumulative_reward_player1 = 0
-        cumulative_reward_player2 = 0
+    # cumulative reward
+    cumulative_reward_player1 = 0
+    cumulative_reward_player2 = 0
 
-        # track performance
-        total_terrain_added = 0
-        total_bombs_placed = 0
+    # track performance
+    total_terrain_added = 0
+    total_bombs_placed = 0
 
-    while game_status_dict['game_properties']['outcome'] == 'ongoing':
+    while not game.ended:
         # set the latest new state to the last state
-        last_state = new_state
-        last_game_status_dict = game_status_dict
+        last_states = new_states
 
         # select an action for the player
-        move_player1 = agent_player1.act(last_state)
-        move_player2 = agent_player2.act(last_state)
+        move_player1 = agent_player1.act(last_states[0])
+        move_player2 = agent_player2.act(last_states[1])
 
         move_player1()
         move_player2()
 
         # update the frame
         game.update_frame()
-        game_status_dict = game.get_status_dict()
-        save_dict('data/{}/{}.pickle'.format(game.id, game.frame), game_status_dict)
-
-        # render the frame
-        frame = np.array(RT.render_current_frame(SAVE_MEDIA))
+        trajectory.write(game)
 
-        # reshape the frame (= the state)
-        new_state = reshape_state(frame, new_height=input_image_height, new_width=input_image_width)
+        # the state of each player
+        new_states = get_states(game, RT, input_image_height, input_image_width)
 
         # update the Q-table
         done = False
         if game.ended:
             done = True
 
-        if game_status_dict['game_properties']['outcome'] == 'ongoing':
-            reward_player1 = calculate_reward(json=game_status_dict, last_json=last_game_status_dict,
-                                              win_lose_ongoing='ongoing')
-            reward_player2 = calculate_reward(json=game_status_dict, last_json=last_game_status_dict,
-                                              win_lose_ongoing='ongoing')
-        elif game_status_dict['game_properties']['outcome'] == 'draw':
-            reward_player1 = calculate_reward(json=game_status_dict, last_json=last_game_status_dict,
-                                              win_lose_ongoing='lose')
-            reward_player2 = calculate_reward(json=game_status_dict, last_json=last_game_status_dict,
-                                              win_lose_ongoing='lose')
-        elif game_status_dict['game_properties']['outcome'] == 'player_1':
-            reward_player1 = calculate_reward(json=game_status_dict, last_json=last_game_status_dict,
-                                              win_lose_ongoing='win')
-            reward_player2 = calculate_reward(json=game_status_dict, last_json=last_game_status_dict,
-                                              win_lose_ongoing='lose')
-        elif game_status_dict['game_properties']['outcome'] == 'player_2':
-            reward_player1 = calculate_reward(json=game_status_dict, last_json=last_game_status_dict,
-                                              win_lose_ongoing='lose')
-            reward_player2 = calculate_reward(json=game_status_dict, last_json=last_game_status_dict,
-                                              win_lose_ongoing='win')
-
-        agent_player1.save_state(last_state=last_state,
+        # the rewards follow from the events of this frame (a draw is a loss too)
+        if game.outcome == ONGOING:
+            results = ['ongoing', 'ongoing']
+        else:
+            results = ['win' if game.outcome == player_number else 'lose' for player_number in (1, 2)]
+        reward_player1 = calculate_reward(events=game.events, player=0, win_lose_ongoing=results[0])
+        reward_player2 = calculate_reward(events=game.events, player=1, win_lose_ongoing=results[1])
+
+        agent_player1.save_state(last_state=last_states[0],
                                  action=move_player1.__name__,
                                  reward=reward_player1,
-                                 new_state=new_state,
+                                 new_state=new_states[0],
                                  done=done)
-        agent_player2.save_state(last_state=last_state,
+        agent_player2.save_state(last_state=last_states[1],
                                  action=move_player2.__name__,
                                  reward=reward_player2,
-                                 new_state=new_state,
+                                 new_state=new_states[1],
                                  done=done)
 
         cumulative_reward_player1 += reward_player1
         cumulative_reward_player2 += reward_player2
 
         # track performance
-        total_terrain_added += calculate_terrain_added(json=game_status_dict, last_json=last_game_status_dict)
-        total_bombs_placed += calculate_bombs_placed(json=game_status_dict)
+        total_terrain_added += game.events.terrain_added
+        total_bombs_placed += sum(game.events.bombs_placed)
+
+    trajectory.close()
+    if REPLAY_MEMORY_ON_DISK:
+        agent_player1.q_table.flush()
+        agent_player2.q_table.flush()
 
     # require at least some terrain addition
     if len(agent_player1.q_table) > BATCH_SIZE:
@@ -156,10 +176,13 @@ for e in tqdm(range(EPISODES)):
 
     # track performance
     RL_performance.append([game.id, round(agent_player1.epsilon,2), cumulative_reward_player1, cumulative_reward_player2,
-                           game_status_dict['game_properties']['outcome'], len(game.players[0].history),
+                           game.status.outcome, len(game.players[0].history),
                            total_terrain_added, total_bombs_placed])
 
     if e > 0 and e % 10 == 0:
         pd.DataFrame(RL_performance, columns=['game_id','epsilon', 'cum_reward_p1', 'cum_reward_p2',
                                               'outcome', 'game_length', 'total_terrain_added',
-                                              'total_bombs_placed']).to_csv('RL_performance.csv')
\ No newline at end of file
+                                              'total_bombs_placed']).to_csv('RL_performance.csv')
+
+if recorder is not None:
+    recorder.close()
@@ -1,8 +1,17 @@
 from PIL import Image
 import os
+import queue
+import threading
 import cv2
 import numpy as np
 
+from game import BLAST_STAGES
+
+## SPRITES ##
+# composed tiles per (map scheme colors, tile size); a tile only depends on its background value and on the set
+# of interactive objects on it, so every combination is baked once and frames are gathered from the cache
+_sprite_caches = dict()
+
 # STANDARD COLORS
 class MapScheme:
 
@@ -68,7 +77,9 @@ class MapScheme:
 
 
 class RenderTool:
-    def __init__(self, game_obj):
+    def __init__(self, game_obj, save_frames=False, video_fps=1):
+        '''Render the frames of a game. Saved media is streamed into one video per game (data/{id}/clip.mp4);
+        with save_frames, every frame is saved as a PNG as well.'''
         self.game = game_obj
         self.color_map = game_obj.map_scheme
 
@@ -78,10 +89,22 @@ class RenderTool:
         # pixel size of a tile
         self.tile_size = 49
 
-        # save frames
-        self.image_path = 'data/{}/'.format(self.game.id)
-        if not os.path.exists(self.image_path):
-            os.makedirs(self.image_path)
+        # the last composed frame, the sprite code of each of its tiles and the state version it shows
+        self._pixels = None
+        self._codes = None
+        self._rendered_version = None
+
+        # media
+        self.save_frames = save_frames
+        self.video_fps = video_fps
+        self._video = None
+        self._video_id = None
+        self._closed_video_id = None
+
+    @property
+    def image_path(self):
+        # frames are saved per game; the id changes when the game is reset
+        return 'data/{}/'.format(self.game.id)
 
     def insert_tile(self, image_pixels, row, column, new_tile, size=1.0):
         if size < 1.0:
@@ -95,7 +118,32 @@ class RenderTool:
             column * self.tile_size:(column + 1) * self.tile_size, :] = new_tile
         return image_pixels
 
+    def _write_video_frame(self, pixels):
+        '''Append an RGBA frame to the video of the current game, opening the video on the first frame.'''
+        if self._video is not None and self._video_id != self.game.id:
+            # the game was reset before it ended
+            self.close_video()
+        if self._video is None:
+            if self.game.id == self._closed_video_id:
+                # the video of this game is already finished
+                return
+            if not os.path.exists(self.image_path):
+                os.makedirs(self.image_path)
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            self._video = cv2.VideoWriter(self.image_path + 'clip.mp4', fourcc, self.video_fps,
+                                          (pixels.shape[1], pixels.shape[0]))
+            self._video_id = self.game.id
+        self._video.write(cv2.cvtColor(pixels, cv2.COLOR_RGBA2BGR))
+
+    def close_video(self):
+        '''Finish the video that is being recorded (done automatically when the game ends).'''
+        if self._video is not None:
+            self._video.release()
+            self._closed_video_id = self._video_id
+            self._video = None
+
     def render_video(self):
+        '''Build the video from the saved PNG frames.'''
         init = True
         for image_path in [x for x in sorted([y for y in os.listdir(self.image_path) if '.png' in y],
                                              key=lambda x: int(x.split('.png')[0]))]:
@@ -116,54 +164,173 @@ class RenderTool:
         out.release()
         cv2.destroyAllWindows()
 
-    def render_current_frame(self, save_media=True):
-        # create blank image
-        img = Image.new("RGBA", (self.x_tiles * self.tile_size, self.y_tiles * self.tile_size), "white")
-
-        # image to pixels
-        img_bg_pixels = np.array(img, dtype='uint8')
-
-        # color pixels using the color map
-        ## background ##
-        for r in range(self.game.board.shape[0]):
-            for c in range(self.game.board.shape[1]):
-                # create tile
-                rgb_color = self.color_map["background"][self.game.board[r, c]][0]
-                size = self.color_map["background"][self.game.board[r, c]][1]
-                new_tile = np.full((self.tile_size, self.tile_size, 4), rgb_color)
-                img_bg_pixels = self.insert_tile(img_bg_pixels, r, c, new_tile, size)
-
-        # pixels to image
-        img_bg = Image.fromarray(img_bg_pixels, 'RGBA')
-
-        ## foreground ##
+    def _bake_sprite(self, background, objects):
+        '''Compose one tile (RGBA) with a background value and a set of interactive objects, layer by layer
+        in the order of the map scheme.'''
+        tile_pixels = np.array(Image.new("RGBA", (self.tile_size, self.tile_size), "white"), dtype='uint8')
+        rgb_color, size = self.color_map["background"][background]
+        tile_pixels = self.insert_tile(tile_pixels, 0, 0, np.full((self.tile_size, self.tile_size, 4), rgb_color), size)
+        tile = Image.fromarray(tile_pixels, 'RGBA')
+
+        foreground = None
         for obj_id in self.color_map["interactive"].keys():
-            img_fg_pixels = np.full(np.array(img_bg).shape, [255, 255, 255, 0], dtype='uint8')
-            for r in range(self.game.board.shape[0]):
-                for c in range(self.game.board.shape[1]):
-                    try:
-                        obj_set = self.game.movable_objects[r][c].copy()
-                        if obj_id in obj_set:
-                            # create tile
-                            rgb_color = self.color_map["interactive"][obj_id][0]
-                            size = self.color_map["interactive"][obj_id][1]
-                            new_tile = np.full((self.tile_size, self.tile_size, 4), rgb_color, dtype='uint8')
-                            img_fg_pixels = self.insert_tile(img_fg_pixels.copy(), r, c, new_tile, size)
-                    except Exception as exc:
-                        print(exc)
-
-            # pixels to image
-            img_fg_temp = Image.fromarray(img_fg_pixels, 'RGBA')
-            try:
-                img_fg = Image.alpha_composite(img_fg, img_fg_temp)
-            except:
-                img_fg = img_fg_temp
+            layer_pixels = np.full((self.tile_size, self.tile_size, 4), [255, 255, 255, 0], dtype='uint8')
+            if obj_id in objects:
+                rgb_color, size = self.color_map["interactive"][obj_id]
+                new_tile = np.full((self.tile_size, self.tile_size, 4), rgb_color, dtype='uint8')
+                layer_pixels = self.insert_tile(layer_pixels, 0, 0, new_tile, size)
+            layer = Image.fromarray(layer_pixels, 'RGBA')
+            foreground = layer if foreground is None else Image.alpha_composite(foreground, layer)
+        return np.array(Image.alpha_composite(tile, foreground), dtype='uint8')
+
+    def _sprites(self):
+        '''The sprite cache of the map scheme and tile size: (sprites, baked flags). Sprite `code` holds the
+        background value `code >> n_objects` and the objects whose bit (in scheme order) is set.'''
+        key = (repr(sorted(self.color_map["background"].items())), repr(list(self.color_map["interactive"].items())),
+               self.tile_size)
+        if key not in _sprite_caches:
+            n_codes = (max(self.color_map["background"]) + 1) << len(self.color_map["interactive"])
+            _sprite_caches[key] = (np.zeros((n_codes, self.tile_size, self.tile_size, 4), dtype='uint8'),
+                                   np.zeros(n_codes, dtype=bool))
+        return _sprite_caches[key]
+
+    def tile_codes(self, cells=None):
+        '''The sprite code of every tile of the current frame (or of the given flat tile indices).'''
+        def plane(values):
+            return values if cells is None else values.ravel()[cells]
+
+        codes = plane(self.game.board).astype(np.intp) << len(self.color_map["interactive"])
+        for bit, obj_id in enumerate(self.color_map["interactive"].keys()):
+            if obj_id < 0:
+                # players (id -1 is slot 0)
+                present = plane(self.game.occupancy) & (1 << (-obj_id - 1))
+            elif obj_id == 1:
+                present = plane(self.game.bomb_timer)
+            elif obj_id in BLAST_STAGES:
+                present = plane(self.game.blast) & (1 << BLAST_STAGES.index(obj_id))
+            else:
+                continue
+            codes[present != 0] |= 1 << bit
+        return codes
+
+    def _baked_sprites(self, codes):
+        '''The sprite cache, with every sprite in codes baked.'''
+        sprites, baked = self._sprites()
+
+        # bake the combinations that were not seen before
+        for code in np.unique(codes[~baked[codes]]):
+            objects = [obj_id for bit, obj_id in enumerate(self.color_map["interactive"].keys()) if code >> bit & 1]
+            sprites[code] = self._bake_sprite(code >> len(self.color_map["interactive"]), objects)
+            baked[code] = True
+        return sprites
+
+    def update_pixels(self):
+        '''Bring the last composed frame up to date with the game and return it (the array is reused between
+        frames). Only the tiles whose sprite changed are redrawn; when the engine reports the cells changed
+        since the last render, only those are checked.'''
+        if self._pixels is None:
+            self._codes = self.tile_codes()
+            self._pixels = self.render_pixels(self._codes)
+        else:
+            cells = self.game.changed_cells(self._rendered_version)
+            if cells is None:
+                cells = np.arange(self._codes.size)
+            codes = self.tile_codes(cells)
+            dirty = codes != self._codes.ravel()[cells]
+            if dirty.any():
+                cells, codes = cells[dirty], codes[dirty]
+                self._codes.ravel()[cells] = codes
+                # (rows, tile, columns, tile, 4) view of the frame
+                tiles = self._pixels.reshape(self.y_tiles, self.tile_size, self.x_tiles, self.tile_size, 4)
+                tiles[cells // self.x_tiles, :, cells % self.x_tiles] = self._baked_sprites(codes)[codes]
+        self._rendered_version = self.game.state_version
+        return self._pixels
 
-        final_img = Image.alpha_composite(img_bg, img_fg)
+    def render_pixels(self, codes=None):
+        '''Render the current frame (or a grid of sprite codes) as an RGBA pixel array.'''
+        if codes is None:
+            codes = self.tile_codes()
+        sprites = self._baked_sprites(codes)
+
+        # gather the sprites: (rows, columns, tile, tile, 4) -> (rows * tile, columns * tile, 4)
+        return sprites[codes].transpose(0, 2, 1, 3, 4).reshape(codes.shape[0] * self.tile_size,
+                                                               codes.shape[1] * self.tile_size, 4)
+
+    def render_current_frame(self, save_media=True):
+        pixels = self.update_pixels()
+        final_img = Image.fromarray(pixels, 'RGBA')
         if save_media:
-            final_img.save(self.image_path + str(self.game.frame) + '.png', 'PNG')
+            if self.save_frames:
+                if not os.path.exists(self.image_path):
+                    os.makedirs(self.image_path)
+                final_img.save(self.image_path + str(self.game.frame) + '.png', 'PNG')
 
+            # stream the frame into the video
+            self._write_video_frame(pixels)
             if self.game.ended:
-                self.render_video()
+                self.close_video()
 
         return final_img.convert('RGB')
+
+
+class MediaRecorder:
+    def __init__(self, game_obj, max_pending=64, save_frames=False, video_fps=1):
+        '''Save the media of a game in the background: record() hands a snapshot of the current frame to a
+        worker thread that renders, encodes and writes it (see RenderTool). At most max_pending frames are
+        queued; record() blocks when the worker falls behind.'''
+        assert len(game_obj.players) == len(game_obj.player_slots), 'Load all players before starting the recorder.'
+        self.game = game_obj
+
+        # the worker renders from its own copy of the game
+        self._render_tool = RenderTool(game_obj.clone(), save_frames=save_frames, video_fps=video_fps)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._worker = threading.Thread(target=self._work, daemon=True)
+        self._worker.start()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    self._render_tool.close_video()
+                    return
+                game_id, state = item
+                if self._error is None:
+                    self._render_tool.game.id = game_id
+                    self._render_tool.game.restore(state)
+                    self._render_tool.render_current_frame(save_media=True)
+            except Exception as exc:
+                # raised in the game loop on the next call
+                self._error = exc
+            finally:
+                self._queue.task_done()
+
+    def _check(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def record(self):
+        '''Queue the current frame of the game for saving.'''
+        self._check()
+        assert self._worker.is_alive(), 'The recorder is closed.'
+        self._queue.put((self.game.id, self.game.snapshot()))
+
+    def flush(self):
+        '''Wait until all queued frames are saved.'''
+        self._queue.join()
+        self._check()
+
+    def close(self):
+        '''Save the queued frames, finish the open video and stop the worker.'''
+        if self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
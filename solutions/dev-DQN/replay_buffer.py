@@ -0,0 +1,255 @@
+'''This file contains the replay memory of the DQN agent: a ring buffer of preallocated arrays.
+
+Every state is stored once, in frame order. The transition leaving the state in slot i (action, reward and
+whether the game ended) is stored in the same slot, and its new state is the state in slot i + 1. A new state
+that is passed in again as the next last state is recognized and not stored twice.'''
+
+import os
+import struct
+import numpy as np
+
+# rounds of rejection sampling before sampling falls back to a scan of the buffer
+MAX_SAMPLE_ROUNDS = 10
+
+
+class ReplayBuffer:
+
+    def __init__(self, capacity, state_shape, state_dtype=np.float32):
+        '''Allocate a buffer of capacity states of state_shape (without the batch axis of 1). One-hot states
+        can be kept as uint8; sampled states are returned as float32.'''
+        self.capacity = capacity
+        self.states = np.zeros((capacity,) + tuple(state_shape), dtype=state_dtype)
+        self.actions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=bool)
+        # whether a slot holds a transition (the last state of a game does not) and how many slots do
+        self.valid = np.zeros(capacity, dtype=bool)
+        self.n_valid = 0
+
+        self.pointer = 0  # the slot that is written next
+        self.n_used = 0  # the slots are written in order, so slots [0, n_used) have been written
+        self._last_new_state = None
+
+    def _write_state(self, state):
+        slot = self.pointer
+        self.states[slot] = state.reshape(self.states.shape[1:])
+        # an overwritten slot no longer starts a transition
+        if self.valid[slot]:
+            self.valid[slot] = False
+            self.n_valid -= 1
+        self.pointer = (slot + 1) % self.capacity
+        self.n_used = max(self.n_used, slot + 1)
+        return slot
+
+    def add(self, last_state, action, reward, new_state, done):
+        '''Add a transition; action is an action code.'''
+        if last_state is not self._last_new_state:
+            # the start of a new sequence of frames
+            self._write_state(last_state)
+        slot = (self.pointer - 1) % self.capacity
+        self.actions[slot] = action
+        self.rewards[slot] = reward
+        self.dones[slot] = done
+        self._write_state(new_state)
+        self.valid[slot] = True
+        self.n_valid += 1
+        self._last_new_state = new_state
+
+    def __len__(self):
+        return self.n_valid
+
+    def sample(self, batch_size):
+        '''Sample batch_size different transitions as arrays: last states, actions, rewards, new states, dones.'''
+        # draw slots among the written ones and reject the slots without a transition (only the last state of
+        # every game) and repeated slots, so sampling does not scan the buffer
+        slots = np.zeros(0, dtype=np.intp)
+        for _ in range(MAX_SAMPLE_ROUNDS):
+            candidates = np.random.randint(0, self.n_used, size=2 * batch_size)
+            slots = np.concatenate([slots, candidates[self.valid[candidates]]])
+            # drop repeats, keeping the order of the draws
+            _, first = np.unique(slots, return_index=True)
+            slots = slots[np.sort(first)]
+            if len(slots) >= batch_size:
+                return self.gather(slots[:batch_size])
+
+        # (almost) no valid slots: pick among all of them
+        slots = np.random.choice(np.flatnonzero(self.valid), batch_size, replace=False)
+        return self.gather(slots)
+
+    def gather(self, slots):
+        '''The transitions of the given slots as arrays.'''
+        next_slots = (slots + 1) % self.capacity
+        return (self.states[slots].astype(np.float32), self.actions[slots], self.rewards[slots],
+                self.states[next_slots].astype(np.float32), self.dones[slots])
+
+
+class SumTree:
+
+    def __init__(self, capacity):
+        '''A binary tree of sums in one array: node i has the children 2i and 2i + 1 and the leaves (one per
+        slot) start at self.offset. Updates and lookups are batched and take O(log n) steps.'''
+        self.offset = 1
+        while self.offset < capacity:
+            self.offset *= 2
+        self.tree = np.zeros(2 * self.offset, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def __getitem__(self, slots):
+        return self.tree[self.offset + slots]
+
+    def update(self, slots, values):
+        '''Set the values of slots and update the sums above them, one level at a time.'''
+        nodes = self.offset + np.atleast_1d(slots)
+        self.tree[nodes] = values
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values):
+        '''The slots at the given cumulative values (each in [0, total)).'''
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.intp)
+        while nodes[0] < self.offset:
+            left = self.tree[2 * nodes]
+            go_right = values >= left
+            values -= left * go_right
+            nodes = 2 * nodes + go_right
+        return nodes - self.offset
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+
+    def __init__(self, capacity, state_shape, state_dtype=np.float32, alpha=0.6, beta=0.4, beta_increment=0.0001,
+                 epsilon=0.01):
+        '''A replay buffer that samples transitions in proportion to their priority (|TD error| + epsilon) ** alpha.
+        New transitions get the highest priority seen so far. The bias is corrected with importance-sampling
+        weights, with beta annealed towards 1 by beta_increment on every sample.'''
+        ReplayBuffer.__init__(self, capacity, state_shape, state_dtype)
+        self.priorities = SumTree(capacity)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon
+        self.max_priority = 1.0
+
+    def _write_state(self, state):
+        slot = ReplayBuffer._write_state(self, state)
+        self.priorities.update(slot, 0.0)
+        return slot
+
+    def add(self, last_state, action, reward, new_state, done):
+        ReplayBuffer.add(self, last_state, action, reward, new_state, done)
+        self.priorities.update((self.pointer - 2) % self.capacity, self.max_priority)
+
+    def sample_with_weights(self, batch_size):
+        '''Sample batch_size transitions in proportion to their priority (one per equal share of the total).
+        Returns the slots, the importance-sampling weights and the transitions (see gather).'''
+        total = self.priorities.total
+        values = (np.arange(batch_size) + np.random.rand(batch_size)) * (total / batch_size)
+        slots = self.priorities.find(np.minimum(values, np.nextafter(total, 0)))
+
+        # importance-sampling weights, scaled to at most 1
+        weights = (len(self) * self.priorities[slots] / total) ** -self.beta
+        weights /= weights.max()
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        return slots, weights.astype(np.float32), self.gather(slots)
+
+    def update_priorities(self, slots, td_errors):
+        '''Set the priorities of sampled transitions from their new TD errors.'''
+        priorities = (np.abs(td_errors) + self.epsilon) ** self.alpha
+        self.priorities.update(slots, priorities)
+        self.max_priority = max(self.max_priority, priorities.max())
+
+
+## DISK-BACKED STORAGE ##
+# file layout:
+#     header (HEADER_SIZE bytes): magic, format version, header size, capacity, state shape and dtype;
+#                                 the amount of transitions is kept at N_VALID_OFFSET and the write pointer
+#                                 at POINTER_OFFSET
+#     columns: valid, actions, rewards and dones (one value per slot)
+#     states: one fixed-size record per slot, from STATES_ALIGNMENT on
+MAGIC = b'RLGRPLY'
+VERSION = 1
+_HEADER_FORMAT = '<7sBHI3sB4I'
+HEADER_SIZE = 64
+N_VALID_OFFSET = 48
+POINTER_OFFSET = 56
+STATES_ALIGNMENT = 4096
+_COLUMNS = (('valid', np.bool_), ('actions', np.int8), ('rewards', np.float32), ('dones', np.bool_))
+
+
+class MemmapReplayBuffer(ReplayBuffer):
+
+    def __init__(self, filepath, capacity, state_shape, state_dtype=np.float32):
+        '''A replay buffer kept in a memory-mapped file, so that it can exceed the memory and survive restarts:
+        an existing file is reopened (it must have the same layout), otherwise it is created. Sampling reads
+        only the records of the sampled slots. The write pointer and the amount of transitions in the header are
+        updated with the records of every transition; use flush() to write the changes to disk.'''
+        self.filepath = filepath
+        self.capacity = capacity
+        state_shape = tuple(state_shape)
+        state_dtype = np.dtype(state_dtype)
+        assert len(state_shape) <= 4, 'States can have at most 4 dimensions.'
+        header = struct.pack(_HEADER_FORMAT, MAGIC, VERSION, HEADER_SIZE, capacity, state_dtype.str.encode(),
+                             len(state_shape), *(state_shape + (0,) * (4 - len(state_shape))))
+
+        exists = os.path.exists(filepath) and os.path.getsize(filepath) >= HEADER_SIZE
+        if exists:
+            with open(filepath, 'rb') as handle:
+                file_header = handle.read(struct.calcsize(_HEADER_FORMAT))
+            assert file_header[:7] == MAGIC, 'Not a replay buffer file.'
+            assert file_header == header, \
+                'The replay buffer file {} holds a different capacity or state layout.'.format(filepath)
+        else:
+            # write the header first; the rest of the file is zeros (all slots empty)
+            with open(filepath, 'wb') as handle:
+                handle.write(header.ljust(HEADER_SIZE, b'\0'))
+
+        # map the columns and the states
+        offset = HEADER_SIZE
+        for name, dtype in _COLUMNS:
+            setattr(self, name, np.memmap(filepath, dtype=dtype, mode='r+', offset=offset, shape=(capacity,)))
+            offset += capacity * np.dtype(dtype).itemsize
+        offset = -(-offset // STATES_ALIGNMENT) * STATES_ALIGNMENT
+        self.states = np.memmap(filepath, dtype=state_dtype, mode='r+', offset=offset,
+                                shape=(capacity,) + state_shape)
+        self._n_valid = np.memmap(filepath, dtype='<u8', mode='r+', offset=N_VALID_OFFSET, shape=(1,))
+        self._pointer = np.memmap(filepath, dtype='<u8', mode='r+', offset=POINTER_OFFSET, shape=(1,))
+        self._last_new_state = None
+        # the buffer has wrapped around once any slot past the pointer holds a transition
+        self.n_used = capacity if self.valid[self.pointer:].any() else self.pointer
+
+        if exists:
+            # the records around the pointer may have been written partially before a crash, so their
+            # transitions are dropped (at most the two oldest transitions of a consistent buffer)
+            stale = np.unique([(self.pointer - 1) % capacity, self.pointer, (self.pointer + 1) % capacity])
+            self.n_valid -= int(np.count_nonzero(self.valid[stale]))
+            self.valid[stale] = False
+
+    @property
+    def pointer(self):
+        return int(self._pointer[0])
+
+    @pointer.setter
+    def pointer(self, value):
+        self._pointer[0] = value
+
+    @property
+    def n_valid(self):
+        return int(self._n_valid[0])
+
+    @n_valid.setter
+    def n_valid(self, value):
+        self._n_valid[0] = value
+
+    def flush(self):
+        '''Write the records and then the header to disk.'''
+        for name, _ in _COLUMNS:
+            getattr(self, name).flush()
+        self.states.flush()
+        self._n_valid.flush()
+        self._pointer.flush()
@@ -17,31 +17,7 @@ def reward_function(bombs_placed, terrain_added, win_lose_ongoing):
         return bombs_placed * 10 + terrain_added * 50
 
 
-def calculate_bombs_placed(json):
-    return len([x for x in json['board_positions']['bombs_and_stage'] if x[2] == 1])
-
-
-def calculate_terrain_added(json, last_json):
-    # extract the frame
-    frame = json['game_properties']['frame']
-
-    # terrain added
-    if frame == 1:
-        previous_amount_of_terrain = len(json['board_positions']['land'])
-    else:
-        previous_amount_of_terrain = len(last_json['board_positions']['land'])
-
-    terrain_added = len(json['board_positions']['land']) - previous_amount_of_terrain
-
-    return terrain_added
-
-
-def calculate_reward(json, last_json, win_lose_ongoing):
-    # bombs placed this frame
-    bombs_placed = calculate_bombs_placed(json)
-
-    # terrain added this frame
-    terrain_added = calculate_terrain_added(json, last_json)
-
-    # reward in this state
-    return reward_function(bombs_placed, terrain_added, win_lose_ongoing)
\ No newline at end of file
+def calculate_reward(events, player, win_lose_ongoing):
+    '''The reward of a player (index in the order the players joined) for the last frame, computed from the
+    event counters of the engine (see game.FrameEvents): the bombs of the player and the land made by its blasts.'''
+    return reward_function(events.bombs_placed[player], events.terrain_added_by[player], win_lose_ongoing)
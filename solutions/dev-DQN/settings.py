@@ -6,6 +6,12 @@ SAVE_MEDIA = False # write out the media files: true/false
 ## DQN-RL parameters ###
 EPISODES = 2000 # How many games to play
 BATCH_SIZE = 32 # batch size used for reinforcing the algorithm
+REPLAY_MEMORY_SIZE = 5000 # amount of frames kept in the replay memory (use millions with the memory on disk)
+REPLAY_MEMORY_ON_DISK = False # keep the replay memory in files in replay/ and reuse it on restart: true/false
+PRIORITIZED_REPLAY = False # sample the replay memory in proportion to the TD errors: true/false
+PRIORITY_ALPHA = 0.6 # how much the TD errors determine the sampling (0 = uniform)
+PRIORITY_BETA = 0.4 # the starting value of the importance-sampling correction (annealed to 1)
+PRIORITY_BETA_INCREMENT = 0.0001 # the increase of the correction per training step
 LEARNING_RATE = 0.001 # the learning rate for the CNN
 EPSILON = 1.0 # the starting value for the curiosity parameter
 EPSILON_MIN = 0.01 # the ending value for the curiosity parameter
@@ -13,5 +19,6 @@ EPSILON_DECAY = 0.999 # the decay for the parameter
 GAMMA = 0.95 # weight for the reward of the next state given the action in the current state
 
 ## GAME parameters##
-PIXELS_PER_TILE = 25 # Image size: How many pixels for one tile?
+STATE_FROM_ENGINE = True # build the state from the game engine (one-hot tiles) instead of the rendered frame
+PIXELS_PER_TILE = 25 # Image size: How many pixels for one tile? (only used for states from the rendered frame)
 
@@ -0,0 +1,145 @@
+'''This file contains an append-only binary trajectory log: one fixed-size record per frame, so that
+readers can memory-map the file and jump to any frame without unpickling.
+
+File layout:
+    header (HEADER_SIZE bytes): magic, format version, header size, rows, columns, players, record size
+    records: one record per frame (see record_dtype), appended in the order the frames were played'''
+
+from game import ACTIONS, N_PLANES
+
+import os
+import struct
+import numpy as np
+
+MAGIC = b'RLGTRAJ'
+VERSION = 1
+_HEADER_FORMAT = '<7sBHHHHI'
+HEADER_SIZE = 64
+
+_ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+
+def record_dtype(board_shape, n_players):
+    '''The numpy dtype of one frame record.'''
+    return np.dtype([('game_id', 'S36'),  # id of the game (a file can hold many games)
+                     ('frame', '<u4'),
+                     ('outcome', 'i1'),  # outcome code of the game at this frame (see game.py)
+                     ('actions', 'i1', (n_players,)),  # action codes that led to this frame (-1 = none)
+                     ('alive', 'u1', (n_players,)),
+                     ('positions', '<i2', (n_players, 2)),
+                     ('planes', 'u1', (N_PLANES,) + tuple(board_shape))])  # terrain, bomb timer, blast, occupancy
+
+
+def make_record(game, out=None, actions=None):
+    '''Fill a record (a one-element array of record_dtype) with the current frame of a game. The actions
+    default to the last moves in the player histories.'''
+    if out is None:
+        out = np.zeros(1, dtype=record_dtype(game.board.shape, len(game.players)))
+    if actions is None:
+        actions = [_ACTION_CODES[player.history[-1]] if player.history else -1 for player in game.players]
+    record = out[0]
+    record['game_id'] = game.id.encode()
+    record['frame'] = game.frame
+    record['outcome'] = game.outcome
+    record['actions'] = actions
+    record['alive'] = [player.alive for player in game.players]
+    record['positions'] = [player.position for player in game.players]
+    record['planes'] = game.planes
+    return out
+
+
+def _read_header(handle):
+    magic, version, header_size, rows, columns, n_players, record_size = \
+        struct.unpack(_HEADER_FORMAT, handle.read(struct.calcsize(_HEADER_FORMAT)))
+    assert magic == MAGIC, 'Not a trajectory file.'
+    assert version == VERSION, 'Unsupported trajectory format version {}.'.format(version)
+    return header_size, (rows, columns), n_players, record_size
+
+
+class TrajectoryWriter:
+
+    def __init__(self, filepath, board_shape, n_players):
+        '''Open a trajectory file for appending (one per game or one per shard of games). A partial record
+        at the end of an existing file is dropped.'''
+        self.filepath = filepath
+        self.dtype = record_dtype(board_shape, n_players)
+        self._record = np.zeros(1, dtype=self.dtype)
+
+        if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
+            with open(filepath, 'rb') as handle:
+                header_size, file_shape, file_players, record_size = _read_header(handle)
+            assert (file_shape, file_players, record_size) == (tuple(board_shape), n_players, self.dtype.itemsize), \
+                'The trajectory file {} holds a different board or amount of players.'.format(filepath)
+            # drop a partial record left by an interrupted write, so that new records stay aligned
+            n_records = (os.path.getsize(filepath) - header_size) // record_size
+            self._handle = open(filepath, 'r+b')
+            self._handle.truncate(header_size + n_records * record_size)
+            self._handle.seek(0, os.SEEK_END)
+        else:
+            self._handle = open(filepath, 'wb')
+            header = struct.pack(_HEADER_FORMAT, MAGIC, VERSION, HEADER_SIZE, board_shape[0], board_shape[1],
+                                 n_players, self.dtype.itemsize)
+            self._handle.write(header.ljust(HEADER_SIZE, b'\0'))
+
+    @classmethod
+    def for_game(cls, filepath, game):
+        return cls(filepath, game.board.shape, len(game.player_slots))
+
+    def write(self, game, actions=None):
+        '''Append the current frame of a game.'''
+        self._handle.write(make_record(game, self._record, actions).tobytes())
+
+    def write_records(self, records):
+        '''Append an array of records (e.g. collected with make_record in another process).'''
+        assert records.dtype == self.dtype, 'The records do not match the layout of this file.'
+        self._handle.write(records.tobytes())
+
+    def close(self):
+        self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TrajectoryReader:
+
+    def __init__(self, filepath):
+        '''Memory-map a trajectory file. Only complete records are mapped.'''
+        self.filepath = filepath
+        with open(filepath, 'rb') as handle:
+            header_size, self.board_shape, self.n_players, record_size = _read_header(handle)
+        self.dtype = record_dtype(self.board_shape, self.n_players)
+        assert self.dtype.itemsize == record_size, 'The record layout of {} is not supported.'.format(filepath)
+
+        n_records = (os.path.getsize(filepath) - header_size) // record_size
+        if n_records > 0:
+            self.records = np.memmap(filepath, dtype=self.dtype, mode='r', offset=header_size, shape=(n_records,))
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        '''The record(s) at a record index; in a file of one game, record N is frame N + 1.'''
+        return self.records[index]
+
+    def game_ids(self):
+        '''The ids of the games in the file, in the order they were written.'''
+        ids, first = np.unique(self.records['game_id'], return_index=True)
+        return [game_id.decode() for game_id in ids[np.argsort(first)]]
+
+    def game(self, game_id):
+        '''The records of one game.'''
+        return self.records[self.records['game_id'] == game_id.encode()]
+
+
+def save_trajectory(filepath, records):
+    '''Append an array of records to a trajectory file, creating it if needed.'''
+    board_shape = records.dtype['planes'].shape[1:]
+    n_players = records.dtype['alive'].shape[0]
+    with TrajectoryWriter(filepath, board_shape, n_players) as writer:
+        writer.write_records(records)
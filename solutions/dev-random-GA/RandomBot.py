@@ -1,67 +1,56 @@
 # source imports
-from game import Game, Player
-from render_tool import RenderTool, MapScheme
+from render_tool import MapScheme
 
 # additional library imports
-import random
+import os
 import pandas as pd
 
 # dev-RL-solution imports
-from utils import save_dict
+from calculate_reward import reward
+from catalog import GameCatalog
+from dataset import DatasetStore
+from selfplay import run_selfplay, still_policy, random_policy, random_bomber_policy
+from trajectory import save_trajectory
 from tqdm import tqdm
 
+N_GAMES = 5000 # how many games to play
+WORKERS = None # amount of worker processes (None = all cores)
 
 
-for _ in tqdm(range(5000)):
+if __name__ == '__main__':
     # choose the map
     #map = MapScheme().IBM
     map = MapScheme().standard
 
-    # initialize the game
-    game = Game(map, verbose=False)
-    RT = RenderTool(game)
-
-    # name the players
-    player1 = Player(game, 'Sonic')
-    player2 = Player(game, 'Knuckles')
-
-    # start the game
-    if game.start():
-        RT.render_current_frame(save_media = False)
-        game_status_dict = game.get_status_dict()
-        save_dict('data/{}/{}.pickle'.format(game.id, game.frame), game_status_dict)
-
-    while game_status_dict['game_properties']['outcome'] == 'ongoing':
-
-        # select an action for the player
-        # move_player1 = random.choice([player1.Still, player1.Up, player1.Down, player1.Left, player1.Right, player1.Bomb])
-        move_player1 = player1.Still
-        move_player1()
-
-        if game.frame == 1:
-            move_player2 = random.choice([player2.Up, player2.Left])
-        elif game.frame == 2:
-            move_player2 = player2.Bomb
-        else:
-            #move_player2 = random.choice([player2.Still, player2.Up, player2.Down, player2.Left, player2.Right, player2.Bomb])
-            move_player2 = random.choice([player2.Up, player2.Down, player2.Left, player2.Right, player2.Bomb])
-            #move_player2 = player2.Still
-        move_player2()
-
-        # update the frame
-        game.update_frame()
-        game_status_dict = game.get_status_dict()
-        save_dict('data/{}/{}.pickle'.format(game.id, game.frame), game_status_dict)
-
-        # render the frame
-        RT.render_current_frame(save_media = False)
-
-    # the outcome
-    if game.verbose:
-        print('outcome: {}'.format(game_status_dict['game_properties']['outcome']))
-
-    # save history
-    moves_history = pd.DataFrame(columns=['player_1', 'player_2'])
-    moves_history['player_1'] = game.players[0].history
-    moves_history['player_2'] = game.players[1].history
-    moves_history.to_csv('data/{}/moves.csv'.format(game.id))
+    # select the policy for each player
+    #policies = [random_policy, random_policy]
+    policies = [still_policy, random_bomber_policy]
+
+    # the columnar store of all games for the offline analysis
+    store = DatasetStore('dataset/')
+    catalog = GameCatalog('catalog.sqlite')
+
+    # play the games in parallel; all files are written here
+    for record in tqdm(run_selfplay(N_GAMES, policies, map, workers=WORKERS), total=N_GAMES):
+        os.makedirs('data/{}'.format(record['id']), exist_ok=True)
+        save_trajectory('data/{}/trajectory.bin'.format(record['id']), record['trajectory'])
+        store.add_game(record['trajectory'])
+
+        # save history
+        moves_history = pd.DataFrame(columns=['player_1', 'player_2'])
+        moves_history['player_1'] = record['history'][0]
+        moves_history['player_2'] = record['history'][1]
+        moves_history.to_csv('data/{}/moves.csv'.format(record['id']))
+
+        # register the game in the catalog (the totals are counted by the engine during play)
+        bombs_placed, terrain_added = sum(record['bombs_placed']), record['terrain_added']
+        catalog.register(record['id'], map['name'], record['frames'], bombs_placed, terrain_added,
+                         outcome=record['trajectory']['outcome'][-1],
+                         cumulative_reward=reward(bombs_placed, terrain_added),
+                         trajectory_path='data/{}/trajectory.bin'.format(record['id']),
+                         moves_path='data/{}/moves.csv'.format(record['id']))
+        # commit per game, so the catalog survives an interrupted run
+        catalog.commit()
+
+    store.flush()
+    catalog.close()
@@ -1,42 +1,27 @@
-import os
-import pandas as pd
-from tqdm import tqdm
-from utils import load_dict
+import numpy as np
+from catalog import GameCatalog
+from dataset import DatasetStore, cumsum_per_game, first_and_last_frames
 
 def reward(bombs_placed, terrain_added):
     return bombs_placed * 10 + terrain_added * 10
 
-for game in tqdm([x for x in os.listdir('data/') if '.' not in x]):
-
-    cumulative_reward = 0
-
-    rewards = []
-
-    for frame_json in sorted([x for x in os.listdir('data/{}'.format(game)) if x.endswith('.pickle')], key=lambda x: int(x.replace('.pickle', ''))):
-        json = load_dict('data/{}/{}'.format(game, frame_json))
-
-        # extract the frame
-        frame = json['game_properties']['frame']
-
-        # bombs placed this frame
-        bombs_placed = len([x for x in json['board_positions']['bombs_and_stage'] if x[2] == 1])
-
-        # terrain added
-        if frame == 1:
-            amount_of_terrain = len(json['board_positions']['land'])
-
-        terrain_added = len(json['board_positions']['land']) - amount_of_terrain
-        amount_of_terrain = len(json['board_positions']['land'])
-
-        # reward in this state
-        added_reward = reward(bombs_placed, terrain_added)
-        cumulative_reward += added_reward
-        relative_reward = round(cumulative_reward / frame, 2)
-
-        # save
-        rewards.append([frame, added_reward, cumulative_reward, relative_reward])
-
-    # write out per game
-    pd.DataFrame(rewards, columns=['frame', 'added_reward', 'cumulative_reward', 'relative_reward'])\
-        .to_csv('data/{}/rewards_total_{}_relative_{}.csv'.format(game, cumulative_reward, relative_reward))
-
+if __name__ == '__main__':
+    # the per-frame counts of all games at once
+    store = DatasetStore('dataset/')
+    games = store.load_games(['game_id'])
+    frames = store.load_frames(['game', 'frame', 'bombs_placed', 'terrain_added'])
+
+    # reward in each state
+    added_reward = reward(frames['bombs_placed'].astype(int), frames['terrain_added'].astype(int))
+    cumulative_reward = cumsum_per_game(added_reward, frames['game'])
+    relative_reward = np.round(cumulative_reward / frames['frame'], 2)
+
+    # one table for the whole corpus
+    store.save_table('rewards', {'game': frames['game'], 'frame': frames['frame'], 'added_reward': added_reward,
+                                 'cumulative_reward': cumulative_reward, 'relative_reward': relative_reward})
+
+    # the totals of every game go to the catalog
+    _, last = first_and_last_frames(frames['game'])
+    with GameCatalog('catalog.sqlite') as catalog:
+        catalog.update_rewards([game_id.decode() for game_id in games['game_id'][frames['game'][last]]],
+                               cumulative_reward[last])
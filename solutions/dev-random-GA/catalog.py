@@ -0,0 +1,79 @@
+'''This file contains a SQLite catalog of played games: every finished game registers one row with its
+summary, so that filtering, pruning and summarizing are indexed queries instead of filesystem scans.'''
+
+# standard libraries
+import sqlite3
+
+# additional libraries
+import pandas as pd
+
+COLUMNS = ('id', 'map', 'frames', 'bombs_placed', 'terrain_added', 'outcome', 'cumulative_reward',
+           'trajectory_path', 'moves_path')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (
+    id TEXT PRIMARY KEY,
+    map TEXT NOT NULL,
+    frames INTEGER NOT NULL,
+    bombs_placed INTEGER NOT NULL,
+    terrain_added INTEGER NOT NULL,
+    outcome INTEGER NOT NULL,  -- outcome code (see game.py)
+    cumulative_reward REAL,
+    trajectory_path TEXT,
+    moves_path TEXT
+);
+CREATE INDEX IF NOT EXISTS games_frames ON games (frames);
+CREATE INDEX IF NOT EXISTS games_bombs_placed ON games (bombs_placed);
+CREATE INDEX IF NOT EXISTS games_cumulative_reward ON games (cumulative_reward);
+'''
+
+
+class GameCatalog:
+
+    def __init__(self, filepath='catalog.sqlite'):
+        '''Open (or create) a catalog.'''
+        self.filepath = filepath
+        self.connection = sqlite3.connect(filepath)
+        self.connection.executescript(_SCHEMA)
+
+    def register(self, game_id, map_name, frames, bombs_placed, terrain_added, outcome, cumulative_reward=None,
+                 trajectory_path=None, moves_path=None):
+        '''Add (or replace) the row of a finished game.'''
+        self.connection.execute('INSERT OR REPLACE INTO games ({}) VALUES ({})'
+                                .format(', '.join(COLUMNS), ', '.join('?' * len(COLUMNS))),
+                                (game_id, map_name, int(frames), int(bombs_placed), int(terrain_added), int(outcome),
+                                 None if cumulative_reward is None else float(cumulative_reward),
+                                 trajectory_path, moves_path))
+
+    def update_rewards(self, game_ids, cumulative_rewards):
+        '''Set the cumulative reward of many games (e.g. after changing the reward function).'''
+        self.connection.executemany('UPDATE games SET cumulative_reward = ? WHERE id = ?',
+                                    zip(map(float, cumulative_rewards), game_ids))
+
+    def select(self, where=None, parameters=(), order_by=None):
+        '''Return the rows matching an SQL condition as a DataFrame.'''
+        query = 'SELECT * FROM games'
+        if where:
+            query += ' WHERE ' + where
+        if order_by:
+            query += ' ORDER BY ' + order_by
+        return pd.read_sql_query(query, self.connection, params=parameters)
+
+    def remove(self, game_ids):
+        self.connection.executemany('DELETE FROM games WHERE id = ?', ((game_id,) for game_id in game_ids))
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM games').fetchone()[0]
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
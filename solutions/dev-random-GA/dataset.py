@@ -0,0 +1,171 @@
+'''This file contains a columnar store of many games for offline analysis. Games are buffered and written
+in chunks of compressed .npz files holding a game table (one row per game) and a frame table (one row per
+frame), so that queries over the whole corpus are array operations instead of per-game file scans.
+
+Run this file to build the store from the trajectory logs in data/.'''
+
+# source imports
+from game import TERRAIN, BOMB_TIMER, BLAST, ONGOING
+from trajectory import TrajectoryReader
+
+# standard libraries
+import glob
+import os
+
+# additional libraries
+import numpy as np
+
+GAME_COLUMNS = ('game_id', 'outcome', 'frames')
+FRAME_COLUMNS = ('game', 'frame', 'bombs_placed', 'land', 'terrain_added', 'blast_cells', 'actions', 'alive',
+                 'planes')
+# the dtype of every column (the actions, alive flags and planes hold an array per frame)
+COLUMN_DTYPES = {'game_id': 'S36', 'outcome': np.int8, 'frames': np.int32,
+                 'game': np.int32, 'frame': np.int32, 'bombs_placed': np.int16, 'land': np.int16,
+                 'terrain_added': np.int16, 'blast_cells': np.int16, 'actions': np.int8, 'alive': np.uint8,
+                 'planes': np.uint8}
+
+
+def frame_columns(records):
+    '''Compute the frame table of one game from its trajectory records.'''
+    planes = records['planes']
+    land = (planes[:, TERRAIN] == 1).sum(axis=(1, 2)).astype(np.int16)
+    return {'frame': records['frame'].astype(np.int32),
+            # bombs in stage 1 were placed this frame
+            'bombs_placed': (planes[:, BOMB_TIMER] == 1).sum(axis=(1, 2)).astype(np.int16),
+            'land': land,
+            # no terrain is added in the first frame
+            'terrain_added': np.concatenate([[0], np.diff(land)]).astype(np.int16),
+            'blast_cells': (planes[:, BLAST] != 0).sum(axis=(1, 2)).astype(np.int16),
+            'actions': np.array(records['actions']),
+            'alive': np.array(records['alive']),
+            'planes': np.array(planes)}
+
+
+def first_and_last_frames(game):
+    '''The row index of the first and the last frame of every game in a frame table (rows are grouped by game).'''
+    if len(game) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    boundaries = np.flatnonzero(np.diff(game)) + 1
+    return np.concatenate([[0], boundaries]), np.concatenate([boundaries - 1, [len(game) - 1]])
+
+
+def cumsum_per_game(values, game):
+    '''The cumulative sum of a frame column, restarted for every game.'''
+    cumulative = np.cumsum(values)
+    first, _ = first_and_last_frames(game)
+    offsets = (cumulative[first] - values[first])[np.searchsorted(first, np.arange(len(game)), side='right') - 1]
+    return cumulative - offsets
+
+
+def sum_per_game(values, game, n_games):
+    '''The sum of a frame column for every game.'''
+    return np.bincount(game, weights=values, minlength=n_games)
+
+
+class DatasetStore:
+
+    def __init__(self, directory='dataset/', chunk_size=500):
+        '''Open (or create) a store in a directory; games are written in chunks of chunk_size games.'''
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self._pending = []
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def chunk_paths(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'chunk_*.npz')))
+
+    def add_game(self, records):
+        '''Add a game from its trajectory records (see trajectory.py).'''
+        self._pending.append(records)
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        '''Write the buffered games as a new chunk.'''
+        if not self._pending:
+            return
+        chunk_paths = self.chunk_paths()
+        number = int(os.path.basename(chunk_paths[-1])[6:-4]) + 1 if chunk_paths else 0
+        self._write_chunk(os.path.join(self.directory, 'chunk_{:05d}.npz'.format(number)),
+                          *self._tables(self._pending))
+        self._pending = []
+
+    @staticmethod
+    def _tables(games):
+        game_table = {'game_id': np.array([records['game_id'][0] for records in games]),
+                      'outcome': np.array([records['outcome'][-1] for records in games], dtype=np.int8),
+                      'frames': np.array([records['frame'][-1] for records in games], dtype=np.int32)}
+        per_game = [frame_columns(records) for records in games]
+        frame_table = {column: np.concatenate([columns[column] for columns in per_game])
+                       for column in FRAME_COLUMNS if column != 'game'}
+        frame_table['game'] = np.repeat(np.arange(len(games), dtype=np.int32), [len(records) for records in games])
+        return game_table, frame_table
+
+    @staticmethod
+    def _write_chunk(path, game_table, frame_table):
+        arrays = {'games/' + column: values for column, values in game_table.items()}
+        arrays.update({'frames/' + column: values for column, values in frame_table.items()})
+        np.savez_compressed(path, **arrays)
+
+    def load_games(self, columns=GAME_COLUMNS):
+        '''Load columns of the game table of all chunks.'''
+        return self._load('games/', columns)
+
+    def load_frames(self, columns=('game', 'frame', 'bombs_placed', 'land', 'terrain_added', 'blast_cells')):
+        '''Load columns of the frame table of all chunks; the 'game' column indexes the game table.'''
+        return self._load('frames/', columns)
+
+    def _load(self, table, columns):
+        loaded = {column: [] for column in columns}
+        n_games = 0
+        for path in self.chunk_paths():
+            with np.load(path) as chunk:
+                for column in columns:
+                    values = chunk[table + column]
+                    # game indices are stored per chunk
+                    loaded[column].append(values + n_games if table == 'frames/' and column == 'game' else values)
+                n_games += len(chunk['games/frames'])
+        # an empty store gives empty columns of the stored dtypes
+        return {column: np.concatenate(values) if values else np.zeros(0, dtype=COLUMN_DTYPES[column])
+                for column, values in loaded.items()}
+
+    def remove_games(self, game_ids):
+        '''Remove the given games, chunk by chunk.'''
+        game_ids = np.array([game_id.encode() if isinstance(game_id, str) else game_id for game_id in game_ids])
+        if len(game_ids) == 0:
+            return
+        for path in self.chunk_paths():
+            with np.load(path) as chunk:
+                tables = {key: chunk[key] for key in chunk.files}
+            keep = ~np.isin(tables['games/game_id'], game_ids)
+            if keep.all():
+                continue
+            if not keep.any():
+                os.remove(path)
+                continue
+            # renumber the kept games
+            new_index = np.cumsum(keep) - 1
+            keep_frames = keep[tables['frames/game']]
+            game_table = {key[6:]: values[keep] for key, values in tables.items() if key.startswith('games/')}
+            frame_table = {key[7:]: values[keep_frames] for key, values in tables.items() if key.startswith('frames/')}
+            frame_table['game'] = new_index[frame_table['game']].astype(np.int32)
+            self._write_chunk(path, game_table, frame_table)
+
+    def save_table(self, name, table):
+        '''Save a derived table (e.g. rewards per frame) next to the chunks.'''
+        np.savez_compressed(os.path.join(self.directory, name + '.npz'), **table)
+
+    def load_table(self, name):
+        with np.load(os.path.join(self.directory, name + '.npz')) as table:
+            return {column: table[column] for column in table.files}
+
+
+if __name__ == '__main__':
+    # build the store from the trajectory logs
+    store = DatasetStore('dataset/')
+    for trajectory_path in sorted(glob.glob('data/*/trajectory.bin')):
+        records = TrajectoryReader(trajectory_path).records
+        if len(records) and records['outcome'][-1] != ONGOING:
+            store.add_game(records)
+    store.flush()
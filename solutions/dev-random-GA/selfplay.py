@@ -0,0 +1,92 @@
+'''This file contains a parallel self-play runner: games are spread over a pool of worker processes,
+every chunk of games has its own seeded random stream and the results are returned to the parent per chunk.'''
+
+# source imports
+from game import Game, Player, STILL, UP, DOWN, LEFT, RIGHT, BOMB
+from trajectory import make_record
+
+# standard libraries
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+import random
+
+# additional libraries
+import numpy as np
+
+
+## POLICIES ##
+# a policy picks the action code of a player: policy(game, player_index, rng) -> action
+# (policies are sent to the workers, so they must be defined at module level)
+
+def still_policy(game, player_index, rng):
+    '''Never move.'''
+    return STILL
+
+
+def random_policy(game, player_index, rng):
+    '''Pick any action at random.'''
+    return rng.choice([STILL, UP, DOWN, LEFT, RIGHT, BOMB])
+
+
+def random_bomber_policy(game, player_index, rng):
+    '''Step out of the corner, drop a bomb and then move or bomb at random.'''
+    if game.frame == 1:
+        return rng.choice([UP, LEFT])
+    elif game.frame == 2:
+        return BOMB
+    return rng.choice([UP, DOWN, LEFT, RIGHT, BOMB])
+
+
+## RUNNER ##
+
+def play_game(game, policies, rng, record_frames=True, max_frames=None):
+    '''Play one game (the game is reset in place) and return its record: the game id, the outcome,
+    the amount of frames, the move history of every player, the event totals (see game.FrameEvents) and,
+    optionally, the trajectory records of every frame (see trajectory.py).'''
+    game.reset()
+    frames = [make_record(game)] if record_frames else []
+    bombs_placed = np.zeros(len(policies), dtype=int)
+    terrain_added = 0
+
+    while not game.ended and (max_frames is None or game.frame < max_frames):
+        game.step([policy(game, player_index, rng) for player_index, policy in enumerate(policies)])
+        bombs_placed += game.events.bombs_placed
+        terrain_added += game.events.terrain_added
+        if record_frames:
+            frames.append(make_record(game))
+
+    return {'id': game.id,
+            'outcome': game.status.outcome,
+            'frames': game.frame,
+            'history': [list(player.history) for player in game.players],
+            'bombs_placed': bombs_placed.tolist(),
+            'terrain_added': terrain_added,
+            'trajectory': np.concatenate(frames) if record_frames else None}
+
+
+def _play_chunk(map_scheme, policies, seed, n_games, record_frames, max_frames):
+    '''Play a chunk of games in a worker, reusing one game for all of them.'''
+    rng = random.Random(seed)
+    game = Game(map_scheme, verbose=False)
+    game.enable_events()
+    for player_index in range(len(policies)):
+        Player(game, 'player_{}'.format(player_index + 1))
+    return [play_game(game, policies, rng, record_frames, max_frames) for _ in range(n_games)]
+
+
+def run_selfplay(n_games, policies, map_scheme, workers=None, chunk_size=50, seed=0, record_frames=True,
+                 max_frames=None):
+    '''Play n_games games with one policy per player on a pool of worker processes (all cores by default).
+    Yields the game records as the chunks finish; the parent is responsible for writing them to disk.
+    Every chunk gets its own random stream derived from the seed, so results do not depend on the
+    amount of workers.'''
+    workers = workers or os.cpu_count()
+    chunk_sizes = [min(chunk_size, n_games - start) for start in range(0, n_games, chunk_size)]
+    chunk_seeds = np.random.RandomState(seed).randint(0, 2 ** 31, size=len(chunk_sizes))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_play_chunk, map_scheme, policies, int(chunk_seed), size, record_frames, max_frames)
+                   for chunk_seed, size in zip(chunk_seeds, chunk_sizes)]
+        for future in as_completed(futures):
+            for record in future.result():
+                yield record
@@ -0,0 +1,61 @@
+'''This file contains a bounded transposition table for search algorithms, keyed by the zobrist hash of a game
+(see Game.enable_hashing).'''
+
+
+class TranspositionTable:
+
+    def __init__(self, size=2 ** 20):
+        '''Initialize a table with room for `size` entries (rounded up to a power of two).
+
+        Every hash maps to a single slot. A new entry replaces the stored one when the stored entry
+        was made in an earlier search (see new_search) or was searched at most as deep.'''
+        self.size = 1 << max(size - 1, 0).bit_length()
+        self._mask = self.size - 1
+        self.clear()
+
+    def new_search(self):
+        '''Start a new search: all entries made so far may be replaced.'''
+        self.generation += 1
+
+    def store(self, key, value, depth=0):
+        '''Store a value (e.g. a score and best move) for a state hash.
+        Returns whether the value was stored.'''
+        key = int(key)
+        slot = key & self._mask
+        stored_key = self._keys[slot]
+        if stored_key is not None and self._generations[slot] == self.generation and self._depths[slot] > depth:
+            # keep the deeper entry of the current search
+            return False
+        if stored_key is None:
+            self.n_entries += 1
+        self._keys[slot] = key
+        self._values[slot] = value
+        self._depths[slot] = depth
+        self._generations[slot] = self.generation
+        return True
+
+    def lookup(self, key, min_depth=0, default=None):
+        '''Return the stored value of a state hash if it was searched at least min_depth deep.'''
+        key = int(key)
+        slot = key & self._mask
+        if self._keys[slot] == key and self._depths[slot] >= min_depth:
+            return self._values[slot]
+        return default
+
+    def __contains__(self, key):
+        key = int(key)
+        return self._keys[key & self._mask] == key
+
+    def __len__(self):
+        return self.n_entries
+
+    def clear(self):
+        '''Remove all entries.'''
+        # one entry per slot
+        self._keys = [None] * self.size
+        self._values = [None] * self.size
+        self._depths = [0] * self.size
+        self._generations = [0] * self.size
+
+        self.generation = 0
+        self.n_entries = 0